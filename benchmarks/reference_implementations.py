@@ -0,0 +1,45 @@
+import numpy as np
+
+##### Previous implementations of the optimized functions, timed by run_benchmarks.py --reference
+
+
+# set_per_face_colors before the bulk foreach_set
+def set_per_face_colors_per_loop(ob, colors_by_face, label):
+
+    color_layer = ob.data.vertex_colors.get(label) or ob.data.vertex_colors.new(name=label)
+
+    for poly, color in zip(ob.data.polygons, colors_by_face):
+        for i, index in enumerate(poly.vertices):
+            loop_index = poly.loop_indices[i]
+            color_layer.data[loop_index].color[0] = color[0]
+            color_layer.data[loop_index].color[1] = color[1]
+            color_layer.data[loop_index].color[2] = color[2]
+            color_layer.data[loop_index].color[3] = 1 # set alpha
+
+# Geodesic add-on storage before the point attributes: (source marker, distance) as one UV per face corner
+def get_uv_layer(ob):
+    uvs = ob.data.uv_layers.get("dists")
+    if uvs is None:
+        uvs = ob.data.uv_layers.new(name="dists")
+    return uvs
+
+def set_uvs_per_corner(ob, uv_values):
+    uvs = get_uv_layer(ob)
+    for face in ob.data.polygons:
+        for vert_idx, loop_idx in zip(face.vertices, face.loop_indices):
+            uvs.data[loop_idx].uv = (uv_values[vert_idx, 0], uv_values[vert_idx, 1])
+
+def get_uvs_per_corner(ob):
+    uv_values = np.zeros((len(ob.data.vertices), 2))
+    uvs = get_uv_layer(ob)
+    for face in ob.data.polygons:
+        for vert_idx, loop_idx in zip(face.vertices, face.loop_indices):
+            uv_values[vert_idx, 0] = uvs.data[loop_idx].uv[0]
+            uv_values[vert_idx, 1] = uvs.data[loop_idx].uv[1]
+
+    return uv_values
+
+def import_ply_operator(ply_file):
+    import bpy
+    bpy.ops.import_mesh.ply(filepath=ply_file)
+    return bpy.context.object
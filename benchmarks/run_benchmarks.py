@@ -0,0 +1,202 @@
+import bpy
+import numpy as np
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import traceback
+
+##### Benchmarks of the mesh utility hot paths on synthetic meshes, run headless with:
+# blender -b --python benchmarks/run_benchmarks.py -- --sizes 10000 100000 1000000 5000000
+#
+# Timings are written to a JSON file (--out). With --baseline, timings are compared to a previous
+# results file and the script exits with code 1 if any of them got slower than baseline * (1 + threshold)
+# (or if a benchmark failed)
+# Geodesic benchmarks are skipped if potpourri3d is not installed in Blender's Python
+# With --reference, the previous implementations (reference_implementations.py) are timed too (slow on big meshes)
+
+ROOT_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(ROOT_FOLDER, 'results_rendering'))
+sys.path.append(os.path.join(ROOT_FOLDER, 'geodesic_distance_ui', 'geodesic_distance_addon'))
+
+from blender_utils import new_mesh_from_arrays, set_per_face_colors, mark_sharp, mark_seam, uv_unwrap, fast_uv_unwrap
+from mesh_properties_io import pack_mesh_properties_to_rgb, unpack_mesh_properties
+from ply_io import write_ply
+from blender_load_meshes import import_ply_native
+import reference_implementations as reference
+
+try:
+    # Import the add-on modules directly, as debug_script.py does
+    sys.argv.append('DEBUG_MODE')
+    from geodesic_project.compute_geodesic_distance import get_mesh_faces, compute, clear_solvers, distance_cache
+    from geodesic_distance_addon_ui import set_point_values, get_point_values, DISTANCE_ATTRIBUTE
+except ImportError as e:
+    print(f"Skipping geodesic benchmarks ({e})")
+    compute = None
+finally:
+    sys.argv.remove('DEBUG_MODE')
+
+DEFAULT_SIZES = [10000, 100000, 1000000, 5000000]
+
+
+# Triangulated grid with about nb_faces faces, split in square patches with one label each
+# Patch boundaries are seams, one boundary out of two is sharp
+def create_synthetic_mesh(nb_faces, nb_patches=8):
+    n = max(2, int(np.sqrt(nb_faces / 2)))
+    x, y = np.meshgrid(np.linspace(0, 1, n + 1), np.linspace(0, 1, n + 1), indexing='ij')
+    V = np.column_stack([x.ravel(), y.ravel(), 0.05 * np.sin(8 * x.ravel()) * np.cos(8 * y.ravel())])
+
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    v00 = (i * (n + 1) + j).ravel()
+    v10 = v00 + n + 1
+    F = np.concatenate([
+        np.column_stack([v00, v10, v10 + 1]),
+        np.column_stack([v00, v10 + 1, v00 + 1])])
+
+    patch_size = max(1, n // nb_patches)
+    pi, pj = np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing='ij')
+    labels = 1 + (pi // patch_size) * (nb_patches + 1) + pj // patch_size
+    is_seam = ((pi % patch_size == 0) | (pj % patch_size == 0)).ravel()
+    is_sharp = is_seam & ((pi // patch_size) % 2 == 0).ravel()
+    degrees = labels % 5
+
+    colors = pack_mesh_properties_to_rgb(labels.ravel(), degrees.ravel(), is_seam, is_sharp)
+
+    mesh = new_mesh_from_arrays(f"synthetic_{nb_faces}", V, F, colors, validate=False)
+    ob = bpy.data.objects.new(mesh.name, mesh)
+    bpy.context.scene.collection.objects.link(ob)
+    bpy.context.view_layer.objects.active = ob
+
+    ply_colors = np.asarray(colors)[:, :3]
+    return ob, is_seam, is_sharp, (V, F, ply_colors)
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+# Import a mesh and delete it right away, so that the scene does not grow with the repeats
+def import_and_remove(import_function, ply_file):
+    ob = import_function(ply_file)
+    mesh = ob.data
+    bpy.data.objects.remove(ob)
+    bpy.data.meshes.remove(mesh)
+
+def get_benchmarks(ob, is_seam, is_sharp, ply_file, reference_versions=False):
+    mesh = ob.data
+    colors_by_face = np.random.rand(len(mesh.polygons), 3)
+    benchmarks = {
+        'unpack_mesh_properties': lambda: unpack_mesh_properties(mesh),
+        'set_per_face_colors': lambda: set_per_face_colors(ob, colors_by_face, "bench"),
+        'mark_sharp': lambda: mark_sharp(ob, is_sharp),
+        'mark_seam': lambda: mark_seam(ob, is_seam),
+        'uv_unwrap': lambda: uv_unwrap(ob),
+        'fast_uv_unwrap': lambda: fast_uv_unwrap(ob),
+        'ply_import_native': lambda: import_and_remove(import_ply_native, ply_file),
+    }
+
+    if reference_versions:
+        uv_values = np.random.rand(len(mesh.vertices), 2)
+        benchmarks.update({
+            'set_per_face_colors_per_loop': lambda: reference.set_per_face_colors_per_loop(ob, colors_by_face, "bench_reference"),
+            'ply_import_operator': lambda: import_and_remove(reference.import_ply_operator, ply_file),
+            'set_uvs_per_corner': lambda: reference.set_uvs_per_corner(ob, uv_values),
+            'get_uvs_per_corner': lambda: reference.get_uvs_per_corner(ob),
+        })
+
+    if compute is not None:
+        distances = np.random.rand(len(mesh.vertices))
+        sources = [0, len(mesh.vertices) // 2]
+        benchmarks.update({
+            'get_mesh_faces': lambda: get_mesh_faces(ob),
+            'set_distances': lambda: set_point_values(ob, DISTANCE_ATTRIBUTE, distances),
+            'get_distances': lambda: get_point_values(ob, DISTANCE_ATTRIBUTE),
+            # First compute: build and factor the solver, then: solve only, then: cached distances
+            'compute_cold': lambda: (clear_solvers(), compute(ob, sources)),
+            'compute_warm': lambda: (distance_cache.clear(), compute(ob, sources)),
+            'compute_cached': lambda: compute(ob, sources),
+        })
+
+    return benchmarks
+
+# Timings slower than baseline * (1 + threshold), as (benchmark, size, time, baseline time)
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for name, times in results.items():
+        for size, t in times.items():
+            baseline_time = baseline.get(name, {}).get(size)
+            if baseline_time is not None and t > baseline_time * (1 + threshold):
+                regressions.append((name, size, t, baseline_time))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', help='Number of faces of the synthetic meshes', type=int, default=DEFAULT_SIZES, nargs='+')
+    parser.add_argument('--repeat', help='Number of runs per benchmark (the best time is kept)', type=int, default=3)
+    parser.add_argument('--only', help='Benchmarks to run (default = all)', type=str, default=None, nargs='+')
+    parser.add_argument('--skip', help='Benchmarks to skip', type=str, default=[], nargs='+')
+    parser.add_argument('--reference', help='Also time the previous implementations of the optimized functions', action='store_true', default=False)
+    parser.add_argument('--out', help='Output JSON file for the timings', type=str, default='benchmark_results.json')
+    parser.add_argument('--baseline', help='JSON file of baseline timings to compare to', type=str, default=None)
+    parser.add_argument('--threshold', help='Allowed slowdown relative to the baseline (0.2 = 20%%)', type=float, default=0.2)
+
+    argv = sys.argv
+    if "--" not in argv:
+        argv = []
+    else:
+        argv = argv[argv.index("--") + 1:]
+
+    args = parser.parse_args(argv)
+
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="benchmarks_") as tmp_folder:
+        for size in args.sizes:
+            bpy.ops.wm.read_homefile(use_empty=True)
+            ob, is_seam, is_sharp, (V, F, ply_colors) = create_synthetic_mesh(size)
+            print(f"Mesh with {len(ob.data.polygons)} faces, {len(ob.data.vertices)} vertices")
+
+            ply_file = os.path.join(tmp_folder, f"synthetic_{size}.ply")
+            write_ply(ply_file, V, F, ply_colors)
+
+            for name, function in get_benchmarks(ob, is_seam, is_sharp, ply_file, args.reference).items():
+                if (args.only is not None and name not in args.only) or name in args.skip:
+                    continue
+                try:
+                    t = best_time(function, args.repeat)
+                except Exception:
+                    traceback.print_exc()
+                    failures.append((name, size))
+                    print(f"  {name:<24}   FAILED")
+                    continue
+                results.setdefault(name, {})[str(size)] = t
+                print(f"  {name:<24} {t:8.4f}s")
+
+    with open(args.out, 'w') as out_file:
+        json.dump(results, out_file, indent=2, sort_keys=True)
+    print(f"Timings written to {args.out}")
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, size, t, baseline_time in regressions:
+            print(f"REGRESSION {name} ({size} faces): {t:.4f}s vs {baseline_time:.4f}s baseline")
+
+        if len(regressions) == 0:
+            print(f"No regression above {args.threshold:.0%} of the baseline")
+
+    for name, size in failures:
+        print(f"FAILED {name} ({size} faces)")
+
+    if len(regressions) > 0 or len(failures) > 0:
+        sys.exit(1)
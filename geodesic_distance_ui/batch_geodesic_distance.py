@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import potpourri3d as pp3d
+
+######### Command line batch mode: geodesic distances for many meshes and source sets, without Blender
+# Needs numpy and potpourri3d only, eg:
+# python batch_geodesic_distance.py meshes/ sources.json out/ --workers 8
+#
+# The sources file is a JSON file, either:
+# - a list of source sets (each a list of vertex indices), used for every mesh
+# - or a dict {mesh file name without extension: list of source sets}, with an optional "*" entry used for the other meshes
+#
+# For each mesh, one solver is prefactored and used for all its source sets. The distances are written to
+# <out>/<mesh name>.npz with a "distances" array (one row per source set) and a "sources_<i>" array per source set
+
+MESH_EXTENSIONS = ('.obj', '.ply', '.off', '.stl')
+
+
+def load_source_sets(path):
+    with open(path) as sources_file:
+        source_sets = json.load(sources_file)
+    if isinstance(source_sets, list):
+        return {'*': source_sets}
+    return source_sets
+
+def compute_mesh_distances(mesh_path, source_sets, out_path):
+    V, F = pp3d.read_mesh(mesh_path)
+    # Each mesh is seen once: no solver cache, the solver is freed when the worker moves on to the next mesh
+    solver = pp3d.MeshHeatMethodDistanceSolver(V, F)
+
+    distances = np.stack([solver.compute_distance_multisource(sources) for sources in source_sets]).astype(np.float32)
+    np.savez_compressed(
+        out_path,
+        distances=distances,
+        **{f"sources_{i}": np.asarray(sources, dtype=np.int64) for i, sources in enumerate(source_sets)})
+
+    return len(V), len(source_sets)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('meshes_folder', help='Folder of meshes (obj, ply, off, stl)', type=str)
+    parser.add_argument('sources', help='JSON file of source vertex sets', type=str)
+    parser.add_argument('out_folder', help='Output folder for the .npz distance files', type=str)
+    parser.add_argument('-j', '--workers', help='Number of worker processes (default = number of CPUs)', type=int, default=None)
+    parser.add_argument('--overwrite', help='Recompute meshes that already have an output file', action='store_true', default=False)
+
+    args = parser.parse_args()
+
+    source_sets_by_mesh = load_source_sets(args.sources)
+    os.makedirs(args.out_folder, exist_ok=True)
+
+    tasks = []
+    for item in sorted(os.listdir(args.meshes_folder)):
+        mesh_name, extension = os.path.splitext(item)
+        if extension.lower() not in MESH_EXTENSIONS:
+            continue
+        source_sets = source_sets_by_mesh.get(mesh_name, source_sets_by_mesh.get('*'))
+        if not source_sets:
+            print(f"No source set for {item}, skipping")
+            continue
+        out_path = os.path.join(args.out_folder, f"{mesh_name}.npz")
+        if os.path.isfile(out_path) and not args.overwrite:
+            print(f"{out_path} exists, skipping")
+            continue
+        tasks.append((os.path.join(args.meshes_folder, item), source_sets, out_path))
+
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(compute_mesh_distances, *task): task[0] for task in tasks}
+        for future in as_completed(futures):
+            mesh_path = futures[future]
+            try:
+                nb_vertices, nb_sets = future.result()
+                print(f"{mesh_path}: {nb_sets} source set(s), {nb_vertices} vertices")
+            except Exception as e:
+                print(f"FAILED {mesh_path}: {e}")
+                failures.append(mesh_path)
+
+    print(f"Done: {len(tasks) - len(failures)}/{len(tasks)} meshes, {len(failures)} failure(s)")
+    if len(failures) > 0:
+        sys.exit(1)
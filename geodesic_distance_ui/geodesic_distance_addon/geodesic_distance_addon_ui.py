@@ -1,93 +1,404 @@
 import bpy
+import os
 import sys
+import time
+import pickle
+import threading
+import subprocess
+from bpy.app.handlers import persistent
 
 import potpourri3d as pp3d
 import numpy as np
 
 #### Load scripts from other files
 if 'DEBUG_MODE' in sys.argv:
-    from geodesic_project.compute_geodesic_distance import compute
+    from geodesic_project.compute_geodesic_distance import compute_from_source_groups, compute_local, mesh_signature, get_mesh_coordinates, get_mesh_faces, mesh_fingerprint, solver_cache, evict_solver, cached_solver_vertex_count, clear_solvers, adjacency_cache, evict_edge_adjacency
 else:
-    from .geodesic_project.compute_geodesic_distance import compute
-
+    from .geodesic_project.compute_geodesic_distance import compute_from_source_groups, compute_local, mesh_signature, get_mesh_coordinates, get_mesh_faces, mesh_fingerprint, solver_cache, evict_solver, cached_solver_vertex_count, clear_solvers, adjacency_cache, evict_edge_adjacency
+
+
+
+# Distances and source markers are stored as per-vertex (point domain) float attributes
+DISTANCE_ATTRIBUTE = "geodesic_distance"
+SOURCE_ATTRIBUTE = "geodesic_source"
+
+# Name of the UV layer previous versions stored (source marker, distance) in
+LEGACY_UV_LAYER = "dists"
+
+def get_point_attribute(ob, name):
+    attribute = ob.data.attributes.get(name)
+    if attribute is None:
+        attribute = ob.data.attributes.new(name=name, type='FLOAT', domain='POINT')
+    return attribute
+
+# Objects whose attributes the add-on just wrote: the depsgraph update this causes is not a geometry edit
+attribute_writes = set()
+
+def set_point_values(ob, name, values):
+    attribute = get_point_attribute(ob, name)
+    attribute.data.foreach_set("value", np.asarray(values, dtype=np.float32))
+    attribute_writes.add(ob.name_full)
+    ob.data.update()
+
+# Only write the given vertices: {vertex index: value}
+def set_some_point_values(ob, name, values):
+    data = get_point_attribute(ob, name).data
+    for i, value in values.items():
+        data[i].value = value
+    attribute_writes.add(ob.name_full)
+    ob.data.update()
+
+def get_point_values(ob, name):
+    values = np.empty(len(ob.data.vertices), dtype=np.float32)
+    get_point_attribute(ob, name).data.foreach_get("value", values)
+    return values
+
+# Make the shader read the point attributes where it read the legacy UV layer:
+# the UV output is replaced by a (source marker, distance, 0) vector, so the rest of the node tree is unchanged.
+# Nodes reading the active render UV map (Texture Coordinate, UV Map without a name) are only rewired if it was the legacy layer
+def use_point_attributes(material, legacy_layer_is_active):
+    nodes = material.node_tree.nodes
+    links = material.node_tree.links
+    if nodes.get("geodesic_attributes") is not None:
+        return
+
+    uv_map_names = (LEGACY_UV_LAYER, "") if legacy_layer_is_active else (LEGACY_UV_LAYER,)
+    uv_outputs = [node.outputs['UV'] for node in nodes if node.type == 'UVMAP' and node.uv_map in uv_map_names]
+    if legacy_layer_is_active:
+        uv_outputs += [node.outputs['UV'] for node in nodes if node.type == 'TEX_COORD']
+    uv_outputs += [node.outputs['Vector'] for node in nodes if node.type == 'ATTRIBUTE' and node.attribute_name == LEGACY_UV_LAYER]
+    if len(uv_outputs) == 0:
+        return
+
+    combine = nodes.new("ShaderNodeCombineXYZ")
+    combine.name = "geodesic_attributes"
+    for name, input_name in [(SOURCE_ATTRIBUTE, 'X'), (DISTANCE_ATTRIBUTE, 'Y')]:
+        attribute_node = nodes.new("ShaderNodeAttribute")
+        attribute_node.attribute_name = name
+        links.new(attribute_node.outputs['Fac'], combine.inputs[input_name])
+
+    for output in uv_outputs:
+        for link in list(output.links):
+            links.new(combine.outputs['Vector'], link.to_socket)
+
+# Objects saved by previous versions: copy the (source marker, distance) UVs to the point attributes,
+# rewire the shader and free the legacy per face corner layer (other UV maps are left untouched)
+def migrate_legacy_uvs(ob):
+    legacy_uvs = ob.data.uv_layers.get(LEGACY_UV_LAYER)
+    # Layers removed in edit mode would come back when leaving it
+    if legacy_uvs is None or ob.mode == 'EDIT':
+        return
 
+    mesh = ob.data
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    legacy_uvs.data.foreach_get("uv", uvs)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_vertices)
 
-def get_uv_layer(ob):
-    uvs = ob.data.uv_layers.get("dists") or ob.data.uv_layers.new(name="dists")
-    ob.data.uv_layers.active = uvs
+    values = np.ones((len(mesh.vertices), 2), dtype=np.float32)
+    values[loop_vertices] = uvs.reshape(-1, 2)
+    set_point_values(ob, SOURCE_ATTRIBUTE, values[:, 0])
+    set_point_values(ob, DISTANCE_ATTRIBUTE, values[:, 1])
 
-    return uvs
+    material = bpy.data.materials.get("dist_shader")
+    if material is not None and material.use_nodes:
+        use_point_attributes(material, legacy_uvs.active_render)
 
-def set_uvs(ob, uv_values):
-    uvs = get_uv_layer(ob)
-    for face in ob.data.polygons:
-        for vert_idx, loop_idx in zip(face.vertices, face.loop_indices):
-            uvs.data[loop_idx].uv = (uv_values[vert_idx, 0], uv_values[vert_idx, 1]) # ie UV coord for each face with vert  me.vertices[vert_idx]
+    mesh.uv_layers.remove(legacy_uvs)
 
-def get_uvs(ob):
-    uv_values = np.zeros((len(ob.data.vertices), 2))
-    uvs = get_uv_layer(ob)
-    for face in ob.data.polygons:
-        for vert_idx, loop_idx in zip(face.vertices, face.loop_indices):
-            uv_values[vert_idx, 0] = uvs.data[loop_idx].uv[0]
-            uv_values[vert_idx, 1] = uvs.data[loop_idx].uv[1]
+def setup_mesh_object(ob):
+    migrate_legacy_uvs(ob)
 
-    return uv_values
+    material = bpy.data.materials.get("dist_shader")
+    if material is not None and material.use_nodes:
+        ob.active_material = material
 
 def get_selected_vertices():
     # If the current active object is not a mesh, return
     if bpy.context.active_object.type != 'MESH':
-        return []
-
-    if bpy.context.mode != 'OBJECT':
-        bpy.ops.object.mode_set(mode='OBJECT')
+        return np.empty(0, dtype=int)
 
     ob = bpy.context.active_object
     mesh = ob.data
-    selected_verts = [v.index for v in mesh.vertices if v.select]
-            
-    # bpy.ops.object.mode_set(mode=current_mode)
 
-    return selected_verts
+    # In edit mode, copy the edit-mode selection to the mesh data (no mode switch)
+    if ob.mode == 'EDIT':
+        ob.update_from_editmode()
+
+    is_selected = np.empty(len(mesh.vertices), dtype=bool)
+    mesh.vertices.foreach_get("select", is_selected)
+
+    return np.flatnonzero(is_selected)
+
+
+##### Solver process
+# potpourri3d holds the GIL while it factorizes (measured: 7.8s without a single tick of the main thread on 250k faces),
+# so the background computations run in a separate Python process instead of a thread (see solver_process.py)
+SOLVER_PROCESS_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "geodesic_project", "solver_process.py")
+
+# Started on the first background computation, keeps its solvers cached until it is stopped
+solver_process = None
+# Objects the solver process has a cached solver for: name -> number of vertices (only changed in the main thread)
+solver_process_meshes = {}
+# Held while writing a message to the solver process (sent from the worker thread and from the depsgraph handler)
+solver_process_lock = threading.Lock()
+
+def get_python_executable():
+    # Blender before 2.91 runs its Python from another binary
+    return getattr(bpy.app, 'binary_path_python', None) or sys.executable
+
+def get_solver_process():
+    global solver_process
+    if solver_process is None or solver_process.poll() is not None:
+        solver_process_meshes.clear()
+        solver_process = subprocess.Popen([get_python_executable(), SOLVER_PROCESS_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    return solver_process
+
+def send_to_solver_process(process, message):
+    with solver_process_lock:
+        pickle.dump(message, process.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+        process.stdin.flush()
+
+# Stop the process (and the computation it is running), its cached solvers are lost
+def stop_solver_process():
+    global solver_process
+    if solver_process is not None:
+        solver_process.kill()
+        solver_process.wait()
+        solver_process = None
+    solver_process_meshes.clear()
+
+def evict_solver_everywhere(key):
+    evict_solver(key)
+    if solver_process_meshes.pop(key, None) is not None and solver_process is not None and solver_process.poll() is None:
+        try:
+            send_to_solver_process(solver_process, ('evict', key))
+        except OSError:
+            pass
+
+def clear_solvers_everywhere():
+    clear_solvers()
+    if solver_process_meshes and solver_process is not None and solver_process.poll() is None:
+        try:
+            send_to_solver_process(solver_process, ('clear',))
+        except OSError:
+            pass
+    solver_process_meshes.clear()
+
+
+# Free cached solvers and adjacencies of deleted meshes, solvers of meshes whose topology was edited
+# (other geometry edits are caught by the fingerprint check on the next compute) and adjacencies of edited meshes
+# (the local mode does not check the fingerprint, to stay independent of the mesh size)
+@persistent
+def evict_stale_solvers(scene, depsgraph):
+    for key in set(solver_cache) | set(solver_process_meshes) | set(adjacency_cache):
+        ob = bpy.data.objects.get(key)
+        if ob is None or ob.type != 'MESH':
+            evict_solver_everywhere(key)
+
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Object) and update.is_updated_geometry:
+            ob = update.id.original
+            if ob.type != 'MESH':
+                continue
+            nb_vertices = len(ob.data.vertices)
+            if cached_solver_vertex_count(ob.name_full) not in (None, nb_vertices) or solver_process_meshes.get(ob.name_full) not in (None, nb_vertices):
+                evict_solver_everywhere(ob.name_full)
+            if ob.name_full not in attribute_writes:
+                evict_edge_adjacency(ob.name_full)
+
+    attribute_writes.clear()
+
+@persistent
+def clear_solvers_on_load(dummy):
+    clear_solvers_everywhere()
+    local_vertices.clear()
+
+@persistent
+def migrate_on_load(dummy):
+    for ob in bpy.data.objects:
+        if ob.type == 'MESH' and ob.data.uv_layers.get(LEGACY_UV_LAYER) is not None:
+            migrate_legacy_uvs(ob)
 
 
 def mesh_poll(self, object):
     return object.type == 'MESH'
 
 
-source_vertices_id = []
+# One group of source vertex indices per "Add Source Vertices" click (distances are cached per group)
+source_groups = []
+
+def get_source_vertices():
+    return sorted(set(v for group in source_groups for v in group))
+
+# Sources are marked with 0 (1 elsewhere), distances are reset to 1
+def set_source_markers(ob):
+    local_vertices.pop(ob.name_full, None)
+    markers = np.ones(len(ob.data.vertices), dtype=np.float32)
+    markers[get_source_vertices()] = 0
+
+    set_point_values(ob, SOURCE_ATTRIBUTE, markers)
+    set_point_values(ob, DISTANCE_ATTRIBUTE, np.ones(len(ob.data.vertices), dtype=np.float32))
 
 def update_mesh(self, context):
     print("Changed mesh")
-    source_vertices_id.clear()
-    if bpy.data.materials.get("dist_shader"):
-        context.scene.geodist_props.mesh_object.active_material = bpy.data.materials["dist_shader"]
+    source_groups.clear()
+    if context.scene.geodist_props.mesh_object is not None:
+        setup_mesh_object(context.scene.geodist_props.mesh_object)
 
 class GeoDistancePropertyGroup(bpy.types.PropertyGroup):
     mesh_object: bpy.props.PointerProperty(name="Mesh", type=bpy.types.Object, poll=mesh_poll, update=update_mesh)
+    use_max_radius: bpy.props.BoolProperty(name="Local", description="Only compute distances up to a maximum radius around the sources (faster on very large meshes)", default=False)
+    max_radius: bpy.props.FloatProperty(name="Max Radius", description="Distances are only computed up to this radius", default=0.05, min=0.0, subtype='DISTANCE')
+
+
+# Distance shown for the vertices beyond the maximum radius in local mode
+OUT_OF_RADIUS_DISTANCE = -1.0
+
+
+# Vertices with a distance from the last local computation: object name -> (mesh signature, vertex indices)
+local_vertices = {}
 
+def apply_distances(ob, dist):
+    local_vertices.pop(ob.name_full, None)
+    set_point_values(ob, DISTANCE_ATTRIBUTE, np.where(np.isfinite(dist), dist, OUT_OF_RADIUS_DISTANCE))
+
+# Local mode result ({vertex index: distance} within the radius): after another local computation on the same mesh,
+# only the vertices within the new or the previous radius are written
+def apply_local_distances(ob, dist):
+    signature = mesh_signature(ob)
+    previous = local_vertices.get(ob.name_full)
+    if previous is not None and previous[0] == signature:
+        values = dict.fromkeys(previous[1] - dist.keys(), OUT_OF_RADIUS_DISTANCE)
+        values.update(dist)
+        set_some_point_values(ob, DISTANCE_ATTRIBUTE, values)
+    else:
+        values = np.full(len(ob.data.vertices), OUT_OF_RADIUS_DISTANCE, dtype=np.float32)
+        values[list(dist)] = list(dist.values())
+        set_point_values(ob, DISTANCE_ATTRIBUTE, values)
+
+    local_vertices[ob.name_full] = (signature, set(dist))
+
+def redraw_panels(context):
+    for area in context.screen.areas:
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
+
+# Computation running in the background (shown in the panel), None if there is none.
+# Only reset once the worker thread has ended, so a second computation cannot start next to it
+background_job = None
 
 class ComputeDistanceOperator(bpy.types.Operator):
     """Distance Computation Script"""          # Use this as a tooltip for menu items and buttons.
     bl_idname = "geodist.compute_operator"        # Unique identifier for buttons and menu items to reference.
     bl_label = "Compute Geodesic Distance"         # Display name in the interface.
 
+    @classmethod
+    def poll(cls, context):
+        return background_job is None and context.scene.geodist_props.mesh_object is not None and len(source_groups) > 0
 
+    # Blocking version (eg when called from a script)
     def execute(self, context):
-        # V = get_mesh_coordinates(context.scene.geodist_props.mesh_object)
-        # F = get_mesh_faces(context.scene.geodist_props.mesh_object)
-        # dist = pp3d.compute_distance_multisource(V,F,source_vertices_id)
-
-        dist = compute(context.scene.geodist_props.mesh_object, source_vertices_id)
-
-        uv_values = get_uvs(context.scene.geodist_props.mesh_object)
+        props = context.scene.geodist_props
+        ob = props.mesh_object
+        migrate_legacy_uvs(ob)
+        if props.use_max_radius:
+            apply_local_distances(ob, compute_local(ob, get_source_vertices(), props.max_radius))
+        else:
+            apply_distances(ob, compute_from_source_groups(ob.name_full, get_mesh_coordinates(ob), get_mesh_faces(ob), source_groups))
 
-        uv_values[:, 1] = dist
-
-        set_uvs(context.scene.geodist_props.mesh_object, uv_values)
+        return {'FINISHED'}
 
+    # From the UI: solve in the solver process on a snapshot of the mesh, the interface stays responsive
+    # (a worker thread sends the mesh and waits for the result)
+    def invoke(self, context, event):
+        global background_job
+
+        # Local mode only visits the region around the sources: no need for a background job
+        if context.scene.geodist_props.use_max_radius:
+            return self.execute(context)
+
+        ob = context.scene.geodist_props.mesh_object
+        migrate_legacy_uvs(ob)
+        V = get_mesh_coordinates(ob)
+        F = get_mesh_faces(ob)
+
+        try:
+            process = get_solver_process()
+        except OSError as e:
+            self.report({'ERROR'}, f"Could not start the solver process: {e}")
+            return {'CANCELLED'}
+        solver_process_meshes[ob.name_full] = len(V)
+
+        self.job = {'object': ob.name_full, 'stage': "Starting", 'start': time.time(), 'done': False, 'cancelled': False}
+        background_job = self.job
+
+        self.worker = threading.Thread(target=self.run, args=(self.job, process, V, F, [list(group) for group in source_groups]), daemon=True)
+        self.worker.start()
+
+        self.timer = context.window_manager.event_timer_add(0.2, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    @staticmethod
+    def run(job, process, V, F, groups):
+        try:
+            job['fingerprint'] = mesh_fingerprint(V, F)
+            send_to_solver_process(process, ('compute', job['object'], V, F, groups))
+            while 'dist' not in job and 'error' not in job:
+                message = pickle.load(process.stdout)
+                if message[0] == 'stage':
+                    job['stage'] = message[1]
+                elif message[0] == 'result':
+                    job['dist'] = message[1]
+                else:
+                    job['error'] = message[1]
+        except EOFError:
+            job['error'] = "the solver process stopped (see the console)"
+        except Exception as e:
+            job['error'] = e
+        job['done'] = True
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and not self.job['cancelled']:
+            # Stopping the solver process interrupts the solve, the worker thread then ends on its own
+            self.job['cancelled'] = True
+            self.job['stage'] = "Cancelling"
+            stop_solver_process()
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'TIMER':
+            redraw_panels(context)
+
+            if self.job['done'] and not self.worker.is_alive():
+                self.finish(context)
+                if self.job['cancelled']:
+                    self.report({'INFO'}, "Geodesic distance computation cancelled")
+                    return {'CANCELLED'}
+                return self.apply(context)
+
+        return {'PASS_THROUGH'}
+
+    def apply(self, context):
+        if 'error' in self.job:
+            self.report({'ERROR'}, f"Geodesic distance computation failed: {self.job['error']}")
+            return {'CANCELLED'}
+
+        # Only apply the distances if the mesh is the one that was solved for
+        ob = context.scene.geodist_props.mesh_object
+        if ob is None or ob.name_full != self.job['object'] or mesh_fingerprint(get_mesh_coordinates(ob), get_mesh_faces(ob)) != self.job['fingerprint']:
+            self.report({'WARNING'}, "Mesh changed during the computation, distances were not applied")
+            return {'CANCELLED'}
+
+        apply_distances(ob, self.job['dist'])
         return {'FINISHED'}
 
+    def finish(self, context):
+        global background_job
+        background_job = None
+        context.window_manager.event_timer_remove(self.timer)
+        redraw_panels(context)
+
 class SetSourceVerticesOperator(bpy.types.Operator):
     """Add Source Vertices"""          # Use this as a tooltip for menu items and buttons.
     bl_idname = "geodist.set_source_vertices"        # Unique identifier for buttons and menu items to reference.
@@ -102,12 +413,41 @@ class SetSourceVerticesOperator(bpy.types.Operator):
 
         # subprocess.run("pbcopy", input=str(selected_vertices_ids).encode())
 
-        source_vertices_id.extend(selected_vertices_ids)
+        if len(selected_vertices_ids) > 0:
+            source_groups.append(selected_vertices_ids.tolist())
+
+        # Attributes written in edit mode would be overwritten when leaving edit mode
+        if context.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        migrate_legacy_uvs(context.scene.geodist_props.mesh_object)
+        set_source_markers(context.scene.geodist_props.mesh_object)
+
+
+        return {'FINISHED'}            # Lets Blender know the operator finished successfully.
+
+class RemoveSourceVerticesOperator(bpy.types.Operator):
+    """Remove Source Vertices"""          # Use this as a tooltip for menu items and buttons.
+    bl_idname = "geodist.remove_source_vertices"        # Unique identifier for buttons and menu items to reference.
+    bl_label = "Remove Source Vertices"         # Display name in the interface.
+
+    @classmethod
+    def poll(cls, context):
+        return bpy.context.active_object and bpy.context.active_object.type == 'MESH'
+
+    def execute(self, context):        # execute() is called when running the operator.
+        removed_vertices = set(get_selected_vertices().tolist())
 
-        uv_values = np.ones((len(context.scene.geodist_props.mesh_object.data.vertices), 2) , dtype=float)
-        uv_values[source_vertices_id, np.zeros(len(source_vertices_id), dtype=int)] = 0
+        # Groups that are not affected keep their cached distances, the others are solved again without the removed vertices
+        groups = [[v for v in group if v not in removed_vertices] for group in source_groups]
+        source_groups[:] = [group for group in groups if len(group) > 0]
 
-        set_uvs(context.scene.geodist_props.mesh_object, uv_values)
+        # Attributes written in edit mode would be overwritten when leaving edit mode
+        if context.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        migrate_legacy_uvs(context.scene.geodist_props.mesh_object)
+        set_source_markers(context.scene.geodist_props.mesh_object)
 
 
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
@@ -119,14 +459,12 @@ class ClearSourceVerticesOperator(bpy.types.Operator):
 
     def execute(self, context):        # execute() is called when running the operator.
 
-        source_vertices_id.clear()
+        source_groups.clear()
 
         if context.mode != 'OBJECT':
             bpy.ops.object.mode_set(mode='OBJECT')
 
-        uv_values = np.ones((len(context.scene.geodist_props.mesh_object.data.vertices), 2) , dtype=float)
-
-        set_uvs(context.scene.geodist_props.mesh_object, uv_values)
+        set_source_markers(context.scene.geodist_props.mesh_object)
 
 
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
@@ -149,14 +487,23 @@ class GeoDistancePanel(bpy.types.Panel):
 
         layout.prop(context.scene.geodist_props, 'mesh_object')
         layout.operator(SetSourceVerticesOperator.bl_idname)
+        layout.operator(RemoveSourceVerticesOperator.bl_idname)
         layout.operator(ClearSourceVerticesOperator.bl_idname)
         
 
         # GET SELECTED VERTICES
         row = layout.row()
         row.label(text="Compute", icon='RIGHTARROW_THIN')
+        layout.prop(context.scene.geodist_props, 'use_max_radius')
+        if context.scene.geodist_props.use_max_radius:
+            layout.prop(context.scene.geodist_props, 'max_radius')
         layout.operator(ComputeDistanceOperator.bl_idname)
 
+        if background_job is not None:
+            elapsed = time.time() - background_job['start']
+            hint = "" if background_job['cancelled'] else " (Esc to cancel)"
+            layout.label(text=f"{background_job['stage']}... {elapsed:.0f}s{hint}", icon='TIME')
+
 
 
 
@@ -166,13 +513,23 @@ def register():
     bpy.types.Scene.geodist_props = bpy.props.PointerProperty(type=GeoDistancePropertyGroup)
     bpy.utils.register_class(ComputeDistanceOperator)
     bpy.utils.register_class(SetSourceVerticesOperator)
+    bpy.utils.register_class(RemoveSourceVerticesOperator)
     bpy.utils.register_class(ClearSourceVerticesOperator)
     bpy.utils.register_class(GeoDistancePanel)
+    bpy.app.handlers.depsgraph_update_post.append(evict_stale_solvers)
+    bpy.app.handlers.load_post.append(clear_solvers_on_load)
+    bpy.app.handlers.load_post.append(migrate_on_load)
 
 def unregister():
+    bpy.app.handlers.depsgraph_update_post.remove(evict_stale_solvers)
+    bpy.app.handlers.load_post.remove(clear_solvers_on_load)
+    bpy.app.handlers.load_post.remove(migrate_on_load)
+    clear_solvers()
+    stop_solver_process()
     del bpy.types.Scene.geodist_props
     bpy.utils.unregister_class(ComputeDistanceOperator)
     bpy.utils.unregister_class(SetSourceVerticesOperator)
+    bpy.utils.unregister_class(RemoveSourceVerticesOperator)
     bpy.utils.unregister_class(ClearSourceVerticesOperator)
     bpy.utils.unregister_class(GeoDistancePanel)
 
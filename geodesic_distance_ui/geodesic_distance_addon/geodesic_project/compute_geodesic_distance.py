@@ -1,8 +1,32 @@
-
-
 import potpourri3d as pp3d
 import numpy as np
+import hashlib
+import heapq
+import threading
+from collections import OrderedDict
+
+# Prefactored heat method solvers, one per mesh object, least recently used first
+# object name -> (fingerprint, solver, estimated size in bytes)
+solver_cache = OrderedDict()
+
+MAX_SOLVER_CACHE_BYTES = 2 * 1024 ** 3
+# Rough estimate of the memory held by the factorized systems of a solver
+SOLVER_BYTES_PER_VERTEX = 1024
+
+# Distance fields of each group of source vertices, least recently used first
+# (object name, mesh fingerprint, sorted source vertices) -> distances
+distance_cache = OrderedDict()
+
+MAX_DISTANCE_CACHE_BYTES = 1024 ** 3
 
+# Edge adjacency (CSR) of each mesh for the radius-bounded mode, least recently used first
+# object name -> (mesh signature, adjacency, size in bytes)
+adjacency_cache = OrderedDict()
+
+MAX_ADJACENCY_CACHE_BYTES = 1024 ** 3
+
+# Held while reading or changing the caches (eg the depsgraph handler evicting while a computation looks up a solver)
+cache_lock = threading.RLock()
 
 
 def get_mesh_coordinates(ob):
@@ -12,15 +36,209 @@ def get_mesh_coordinates(ob):
     V.shape = (count, 3)
     return V
 
+# Triangulated faces (works for quads and n-gons too), read in one go from the loop triangles
 def get_mesh_faces(ob):
-    count = len(ob.data.vertices)
-    F = np.empty((0, 3), dtype=int)
-    for p in ob.data.polygons:
-        F = np.row_stack([F, p.vertices])
+    mesh = ob.data
+    mesh.calc_loop_triangles()
+    count = len(mesh.loop_triangles)
+    F = np.empty(count * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", F)
+    F.shape = (count, 3)
     return F
 
+# Identifies the topology and geometry the solver was built for
+def mesh_fingerprint(V, F):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(V).data)
+    h.update(np.ascontiguousarray(F).data)
+    return (len(V), len(F), h.hexdigest())
+
+def get_solver(key, V, F, fingerprint=None):
+    if fingerprint is None:
+        fingerprint = mesh_fingerprint(V, F)
+
+    with cache_lock:
+        entry = solver_cache.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            solver_cache.move_to_end(key)
+            return entry[1]
+
+        # New mesh or mesh edited since last time: rebuild and refactor
+        evict_solver(key)
+
+    # Factorization outside of the lock, it can take a while
+    solver = pp3d.MeshHeatMethodDistanceSolver(V, F)
+
+    with cache_lock:
+        solver_cache[key] = (fingerprint, solver, len(V) * SOLVER_BYTES_PER_VERTEX)
+
+        # Stay under the memory cap by dropping the least recently used solvers (but always keep this one)
+        while len(solver_cache) > 1 and cached_solvers_bytes() > MAX_SOLVER_CACHE_BYTES:
+            solver_cache.popitem(last=False)
+
+    return solver
+
+def cached_solvers_bytes():
+    with cache_lock:
+        return sum(nb_bytes for _, _, nb_bytes in solver_cache.values())
+
+def cached_solver_vertex_count(key):
+    with cache_lock:
+        entry = solver_cache.get(key)
+    return entry[0][0] if entry is not None else None
+
+def evict_solver(key):
+    with cache_lock:
+        solver_cache.pop(key, None)
+        adjacency_cache.pop(key, None)
+        for cache_key in [cache_key for cache_key in distance_cache if cache_key[0] == key]:
+            del distance_cache[cache_key]
+
+def clear_solvers():
+    with cache_lock:
+        solver_cache.clear()
+        adjacency_cache.clear()
+        distance_cache.clear()
+
+def get_cached_distances(cache_key):
+    with cache_lock:
+        dist = distance_cache.get(cache_key)
+        if dist is not None:
+            distance_cache.move_to_end(cache_key)
+    return dist
+
+def cache_distances(cache_key, dist):
+    with cache_lock:
+        distance_cache[cache_key] = dist
+        # Stay under the memory budget by dropping the least recently used fields (but always keep this one)
+        while len(distance_cache) > 1 and sum(d.nbytes for d in distance_cache.values()) > MAX_DISTANCE_CACHE_BYTES:
+            distance_cache.popitem(last=False)
+
+# Distance to the closest source, with sources given as groups (eg one group per "Add Source Vertices" click)
+# Each group is solved once (one multi-source solve) and cached: adding a group costs one solve plus an
+# element-wise minimum, removing one only recombines the cached fields of the others
+# Works on arrays only (no bpy access), so it can run out of Blender (see solver_process.py)
+# on_stage: optional callback called with a description of the current stage
+def compute_from_source_groups(key, V, F, source_groups, on_stage=None):
+    fingerprint = mesh_fingerprint(V, F)
+    solver = None
+
+    dist = None
+    for i, group in enumerate(source_groups):
+        cache_key = (key, fingerprint, tuple(sorted(set(group))))
+        group_dist = get_cached_distances(cache_key)
+        if group_dist is None:
+            if solver is None:
+                if on_stage is not None:
+                    on_stage("Preparing solver")
+                solver = get_solver(key, V, F, fingerprint)
+            if on_stage is not None:
+                on_stage(f"Solving ({i + 1}/{len(source_groups)})")
+            group_dist = solver.compute_distance_multisource(list(cache_key[2]))
+            cache_distances(cache_key, group_dist)
+
+        dist = group_dist.copy() if dist is None else np.minimum(dist, group_dist, out=dist)
+
+    return dist
+
+def compute_from_arrays(key, V, F, sources, on_stage=None):
+    return compute_from_source_groups(key, V, F, [sources], on_stage=on_stage)
+
 def compute(ob, sources):
     V = get_mesh_coordinates(ob)
     F = get_mesh_faces(ob)
-    dist = pp3d.compute_distance_multisource(V,F,sources)
-    return dist
\ No newline at end of file
+    return compute_from_arrays(ob.name_full, V, F, sources)
+
+
+#### Radius-bounded mode: front propagation along mesh edges that stops at a maximum distance,
+#### so the cost depends on the size of the region within the radius, not on the whole mesh
+#### (distances are shortest paths along edges, an upper bound of the geodesic distance)
+
+# CSR edge adjacency: neighbors of vertex i are indices[indptr[i]:indptr[i + 1]], at distances lengths[...]
+def build_edge_adjacency(V, F):
+    edges = np.concatenate([F[:, [0, 1]], F[:, [1, 2]], F[:, [2, 0]]])
+    edges = np.concatenate([edges, edges[:, ::-1]])
+    edges = np.unique(edges, axis=0) # Sorted by first vertex
+
+    indptr = np.zeros(len(V) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[:, 0], minlength=len(V)), out=indptr[1:])
+    indices = edges[:, 1]
+    lengths = np.linalg.norm(V[edges[:, 1]] - V[edges[:, 0]], axis=1)
+
+    return indptr, indices, lengths
+
+# Cached adjacency if it was built for a mesh with this signature, None otherwise (no work on the mesh data)
+def get_cached_edge_adjacency(key, signature):
+    with cache_lock:
+        entry = adjacency_cache.get(key)
+        if entry is None or entry[0] != signature:
+            return None
+        adjacency_cache.move_to_end(key)
+        return entry[1]
+
+# The signature defaults to the mesh fingerprint, the add-on passes cheap element counts instead
+# and evicts the adjacency when the geometry is edited (see evict_edge_adjacency)
+def get_edge_adjacency(key, V, F, signature=None):
+    if signature is None:
+        signature = mesh_fingerprint(V, F)
+
+    adjacency = get_cached_edge_adjacency(key, signature)
+    if adjacency is not None:
+        return adjacency
+
+    adjacency = build_edge_adjacency(V, F)
+    with cache_lock:
+        adjacency_cache[key] = (signature, adjacency, sum(array.nbytes for array in adjacency))
+
+        # Stay under the memory budget by dropping the least recently used adjacencies (but always keep this one)
+        while len(adjacency_cache) > 1 and sum(nb_bytes for _, _, nb_bytes in adjacency_cache.values()) > MAX_ADJACENCY_CACHE_BYTES:
+            adjacency_cache.popitem(last=False)
+
+    return adjacency
+
+def evict_edge_adjacency(key):
+    with cache_lock:
+        adjacency_cache.pop(key, None)
+
+# Distances up to max_radius from the closest source: {vertex index: distance} for the vertices within the radius only,
+# so the cost only depends on the size of the region
+def propagate_distances(adjacency, sources, max_radius):
+    indptr, indices, lengths = adjacency
+
+    dist = {int(v): 0.0 for v in sources}
+    front = [(0.0, v) for v in dist]
+    heapq.heapify(front)
+
+    while front:
+        d, v = heapq.heappop(front)
+        if d > dist[v]:
+            continue
+        start, end = indptr[v], indptr[v + 1]
+        for u, length in zip(indices[start:end].tolist(), lengths[start:end].tolist()):
+            du = d + length
+            if du <= max_radius and du < dist.get(u, np.inf):
+                dist[u] = du
+                heapq.heappush(front, (du, u))
+
+    return dist
+
+# Full array version: np.inf beyond max_radius
+def compute_local_from_arrays(key, V, F, sources, max_radius):
+    adjacency = get_edge_adjacency(key, V, F)
+    dist = np.full(len(V), np.inf)
+    reached = propagate_distances(adjacency, sources, max_radius)
+    dist[list(reached)] = list(reached.values())
+    return dist
+
+# Cheap signature of the mesh of an object (counts only, no pass over the data)
+def mesh_signature(ob):
+    return (len(ob.data.vertices), len(ob.data.edges), len(ob.data.polygons))
+
+# Radius-bounded distances of an object: {vertex index: distance} within the radius.
+# The mesh data is only read when the adjacency is not cached yet
+def compute_local(ob, sources, max_radius):
+    signature = mesh_signature(ob)
+    adjacency = get_cached_edge_adjacency(ob.name_full, signature)
+    if adjacency is None:
+        adjacency = get_edge_adjacency(ob.name_full, get_mesh_coordinates(ob), get_mesh_faces(ob), signature)
+    return propagate_distances(adjacency, sources, max_radius)
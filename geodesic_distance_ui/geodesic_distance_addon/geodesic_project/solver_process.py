@@ -0,0 +1,47 @@
+import os
+import sys
+import pickle
+
+# Run as a script with Blender's Python (no bpy needed): import the compute module from this folder
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from compute_geodesic_distance import compute_from_source_groups, evict_solver, clear_solvers
+
+##### Solver process of the add-on
+# potpourri3d holds the GIL while it factorizes and solves, so running it in a thread of Blender's process
+# would still freeze the interface: the add-on sends the computations to this process instead.
+# Solvers and distance fields stay cached here between computations.
+#
+# Messages are pickled tuples, read from stdin and written to stdout:
+# ('compute', key, V, F, source_groups) -> ('stage', description)... then ('result', distances) or ('error', message)
+# ('evict', key) and ('clear',) -> no answer
+
+
+def send(output, message):
+    pickle.dump(message, output, protocol=pickle.HIGHEST_PROTOCOL)
+    output.flush()
+
+
+if __name__ == "__main__":
+    messages = sys.stdin.buffer
+    output = sys.stdout.buffer
+    # Anything printed goes to stderr, stdout only carries the answers
+    sys.stdout = sys.stderr
+
+    while True:
+        try:
+            message = pickle.load(messages)
+        except EOFError:
+            break
+
+        if message[0] == 'compute':
+            _, key, V, F, source_groups = message
+            try:
+                dist = compute_from_source_groups(key, V, F, source_groups, on_stage=lambda stage: send(output, ('stage', stage)))
+                send(output, ('result', dist))
+            except Exception as e:
+                send(output, ('error', f"{type(e).__name__}: {e}"))
+        elif message[0] == 'evict':
+            evict_solver(message[1])
+        elif message[0] == 'clear':
+            clear_solvers()
@@ -8,46 +8,85 @@ import os
 import csv
 import argparse
 import re
+import json
+import hashlib
 
 # Add current directory to system path to be able to import scripts with python
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 
 from mesh_properties_io import unpack_mesh_properties
+from ply_io import read_ply
 from blender_utils import *
+from tracing import trace, enable_tracing, set_trace_context, update_trace_context
 
 ROOT_FOLDER = os.path.dirname(os.path.realpath(__file__))
 MESHES_FOLDER = os.path.join(ROOT_FOLDER, 'meshes')
 OUT_FOLDER = os.path.join(ROOT_FOLDER, 'out')
+UV_CACHE_FOLDER = os.path.join(OUT_FOLDER, 'uv_cache')
 BLENDER_CAMERA_DATA_PATH = os.path.join(ROOT_FOLDER, 'data', 'blender_cameras.csv')
 
-def load_exported_ply_result(ply_file):
+# Load a binary ply file with the memory-mapped reader and bulk mesh creation (no import operator)
+def import_ply_native(ply_file):
+    V, F, vertex_colors = read_ply(ply_file)
 
-    # Load mesh file
-    bpy.ops.import_mesh.ply(filepath=ply_file)
-    ob = bpy.context.object
-
-    ob.rotation_euler[0] = math.radians(90) # Correct axis orientations
+    # Correct axis orientations (90 degrees rotation around X), directly on the coordinates
+    V = np.column_stack([V[:, 0], -V[:, 2], V[:, 1]])
 
-    mesh = ob.data
+    mesh_name = os.path.splitext(os.path.basename(ply_file))[0]
+    mesh = new_mesh_from_arrays(mesh_name, V, F, vertex_colors)
+    ob = bpy.data.objects.new(mesh_name, mesh)
+    bpy.context.scene.collection.objects.link(ob)
 
     bpy.ops.object.select_all(action='DESELECT')
     bpy.context.view_layer.objects.active = ob
     ob.select_set(True)
-    bpy.ops.object.transform_apply() # Apply all transforms
 
-    sharpness_by_vertex, vertex_is_seam, label_by_poly, degree_by_poly = unpack_mesh_properties(mesh)
-    label_color_layer = mesh.vertex_colors['Col']
+    return ob
 
-    set_per_face_colors(ob, np.column_stack([label_by_poly, degree_by_poly, np.zeros(len(label_by_poly))]), label_color_layer.name)
+# uv_cache_folder: restore/store the unwrapped UVs there (None = always unwrap), uv_method: 'ANGLE_BASED' or 'FAST'
+def load_exported_ply_result(ply_file, native_ply=False, uv_cache_folder=UV_CACHE_FOLDER, uv_method='ANGLE_BASED'):
+
+    mesh_name = os.path.splitext(os.path.basename(ply_file))[0]
+    set_trace_context(mesh=mesh_name)
+
+    # Load mesh file
+    with trace("ply_import", native=native_ply):
+        if native_ply:
+            ob = import_ply_native(ply_file)
+        else:
+            bpy.ops.import_mesh.ply(filepath=ply_file)
+            ob = bpy.context.object
 
-    mark_sharp(ob, sharpness_by_vertex)
-    mark_seam(ob, vertex_is_seam)
+            ob.rotation_euler[0] = math.radians(90) # Correct axis orientations
 
-    # Shade smooth
-    bpy.ops.object.shade_smooth()
+            bpy.ops.object.select_all(action='DESELECT')
+            bpy.context.view_layer.objects.active = ob
+            ob.select_set(True)
+            bpy.ops.object.transform_apply() # Apply all transforms
+
+        update_trace_context(vertices=len(ob.data.vertices), faces=len(ob.data.polygons))
+
+    mesh = ob.data
+
+    with trace("unpack_mesh_properties"):
+        sharpness_by_vertex, vertex_is_seam, label_by_poly, degree_by_poly = unpack_mesh_properties(mesh)
+    label_color_layer = mesh.vertex_colors['Col']
+
+    with trace("set_per_face_colors"):
+        set_per_face_colors(ob, np.column_stack([label_by_poly, degree_by_poly, np.zeros(len(label_by_poly))]), label_color_layer.name)
+
+    # Sharp edges (+ EdgeSplit modifier and smooth shading) and UV seams
+    with trace("mark_sharp_and_seam"):
+        mark_sharp_and_seam(ob, sharpness_by_vertex, vertex_is_seam)
 
     # UVs
-    uv_unwrap(ob)
+    with trace("uv_unwrap", method=uv_method) as record:
+        if uv_cache_folder is not None:
+            record['cached'] = cached_uv_unwrap(ob, uv_cache_folder, name=mesh_name, method=uv_method)
+        elif uv_method == 'FAST':
+            fast_uv_unwrap(ob)
+        else:
+            uv_unwrap(ob)
 
     bpy.ops.object.select_all(action='DESELECT')
 
@@ -61,6 +100,92 @@ def load_exported_ply_result(ply_file):
     return ob
 
 
+def create_mesh_collection(mesh_name, ply_file, camera_data, materials, native_ply=False, uv_cache_folder=UV_CACHE_FOLDER, uv_method='ANGLE_BASED'):
+
+    # Create a collection with the name of the mesh
+    collection = bpy.data.collections.new(mesh_name)
+    bpy.context.scene.collection.children.link(collection)
+
+    # Position camera
+    if camera_data is not None:
+        for i in [1,2]:
+            cam1_loc = eval(camera_data[f'cam{i}_loc'])
+            cam1_rot = eval(camera_data[f'cam{i}_rot'])
+
+            cam1_obj = create_camera(f"{mesh_name}_camera{i}", cam1_loc, cam1_rot)
+            set_collection(cam1_obj, collection)
+    else:
+        # Create a default camera
+        cam_obj = create_camera(f"{mesh_name}_camera", (0, 0, 0.5), (0, 0, 0))
+        set_collection(cam_obj, collection)
+
+    # Load mesh
+    mesh_object = load_exported_ply_result(ply_file, native_ply=native_ply, uv_cache_folder=uv_cache_folder, uv_method=uv_method)
+    name = f"{mesh_name}_result"
+    mesh_object.name = name
+    set_collection(mesh_object, collection)
+
+    # Add more materials
+    for material_name in materials:
+        mesh_object.data.materials.append(get_or_load_mat(material_name))
+
+    # Hide collection so that the blender file is easier to navigate
+    hide_col(collection)
+
+    return collection
+
+def remove_mesh_collection(mesh_name):
+    collection = bpy.data.collections.get(mesh_name)
+    if collection is None:
+        return
+    for ob in list(collection.objects):
+        data = ob.data
+        bpy.data.objects.remove(ob, do_unlink=True)
+        if data is not None and data.users == 0:
+            if isinstance(data, bpy.types.Mesh):
+                bpy.data.meshes.remove(data)
+            elif isinstance(data, bpy.types.Camera):
+                bpy.data.cameras.remove(data)
+    bpy.data.collections.remove(collection)
+
+#### Manifest of the inputs each mesh collection was built from (used by --incremental)
+
+def get_manifest_path(blend_file_path):
+    return os.path.splitext(blend_file_path)[0] + ".manifest.json"
+
+def load_manifest(blend_file_path):
+    manifest_path = get_manifest_path(blend_file_path)
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+def save_manifest(blend_file_path, manifest):
+    with open(get_manifest_path(blend_file_path), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+def hash_file(file_path):
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def get_mesh_inputs(ply_file, camera_data, materials, uv_method='ANGLE_BASED', native_ply=False):
+    return {
+        'ply_hash': hash_file(ply_file),
+        'camera': camera_data,
+        'materials': list(materials),
+        'uv_method': uv_method,
+        'native_ply': native_ply,
+    }
+
+def save(blend_file_path, manifest):
+    with trace("save_mainfile", mesh=os.path.basename(blend_file_path), vertices=None, faces=None):
+        bpy.ops.wm.save_mainfile(filepath=blend_file_path)
+    save_manifest(blend_file_path, manifest)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
@@ -68,6 +193,12 @@ if __name__ == "__main__":
     parser.add_argument('--blend-file', help='Name of the output blend file', type=str, default=None)
     parser.add_argument('--turntables', help='Prepare for turntable animations', dest='turntables', action='store_true', default=False)
     parser.add_argument('--materials', help='Name of the material(s) to load. They should be defined in data/materials.blend file.', type=str, default=[], required=False, nargs='+')
+    parser.add_argument('--native-ply', help='Load binary ply files with the memory-mapped reader instead of the ply import operator', dest='native_ply', action='store_true', default=False)
+    parser.add_argument('--incremental', help='Update the existing blend file: only rebuild the meshes whose ply file, camera data or materials changed', dest='incremental', action='store_true', default=False)
+    parser.add_argument('--trace', help='Write per-stage timings and memory use to this JSON lines file (summarize with tracing.py)', dest='trace', type=str, default=None)
+    parser.add_argument('--uv-method', help='ANGLE_BASED (unwrap operator) or FAST (per chart planar projection, no solve)', dest='uv_method', type=str.upper, choices=['ANGLE_BASED', 'FAST'], default='ANGLE_BASED')
+    parser.add_argument('--no-uv-cache', help='Always unwrap, instead of restoring the UVs cached in out/uv_cache for unchanged meshes and seams', dest='uv_cache', action='store_false', default=True)
+    parser.add_argument('--checkpoint', help='Save the blend file every N loaded meshes (default = 0, save once at the end)', dest='checkpoint', type=int, default=0)
 
 
     # get the args passed to blender after "--", all of which are ignored by
@@ -80,6 +211,8 @@ if __name__ == "__main__":
 
     args = parser.parse_args(argv)
 
+    if args.trace is not None:
+        enable_tracing(args.trace)
 
     result_meshes_folder = MESHES_FOLDER
 
@@ -90,8 +223,17 @@ if __name__ == "__main__":
 
     blend_file_path = os.path.join(OUT_FOLDER, f"{blend_file_name}.blend")
 
-    # Init blender
-    setup_scene(os.path.join(ROOT_FOLDER, 'data/interior.exr'))
+    manifest = {}
+    if args.incremental and os.path.isfile(blend_file_path):
+        # Start from the existing scene
+        bpy.ops.wm.open_mainfile(filepath=blend_file_path)
+        manifest = load_manifest(blend_file_path)
+    else:
+        # Init blender
+        setup_scene(os.path.join(ROOT_FOLDER, 'data/interior.exr'))
+
+    # Load all needed materials at once
+    load_materials(["rainbow-labels"] + args.materials)
 
 
 
@@ -108,6 +250,15 @@ if __name__ == "__main__":
         if os.path.isfile(os.path.join(result_meshes_folder, item)) and os.path.splitext(item)[1] == '.ply' and re.match(args.mesh, item):
             files.append(item)
 
+    # Drop the meshes whose ply file was removed
+    mesh_names = [os.path.splitext(f)[0] for f in files]
+    for mesh_name in list(manifest):
+        if re.match(args.mesh, mesh_name + '.ply') and mesh_name not in mesh_names:
+            print(f"Removing {mesh_name}")
+            remove_mesh_collection(mesh_name)
+            del manifest[mesh_name]
+
+    nb_loaded = 0
     for f in sorted(files):
 
         mesh_name, extension = os.path.splitext(f)
@@ -117,41 +268,24 @@ if __name__ == "__main__":
         else:
             camera_data = None
 
-
-        # Create a collection with the name of the mesh
-        collection = bpy.data.collections.new(mesh_name)
-        bpy.context.scene.collection.children.link(collection)
-
-        # Position camera
-        if camera_data is not None:
-            for i in [1,2]:
-                cam1_loc = eval(camera_data[f'cam{i}_loc'])
-                cam1_rot = eval(camera_data[f'cam{i}_rot'])
-
-                cam1_obj = create_camera(f"{mesh_name}_camera{i}", cam1_loc, cam1_rot)
-                set_collection(cam1_obj, collection)
-        else:
-            # Create a default camera
-            cam_obj = create_camera(f"{mesh_name}_camera", (0, 0, 0.5), (0, 0, 0))
-            set_collection(cam_obj, collection)
-
-        # Load mesh
         result_mesh_path = os.path.join(result_meshes_folder, f)
-        mesh_object = load_exported_ply_result(result_mesh_path)
-        name = f"{mesh_name}_result"
-        mesh_object.name = name
-        set_collection(mesh_object, collection)
+        mesh_inputs = get_mesh_inputs(result_mesh_path, camera_data, args.materials, args.uv_method, args.native_ply)
 
-        # Add more materials
-        for material_name in args.materials:
-            mesh_object.data.materials.append(get_or_load_mat(material_name))
+        if args.incremental:
+            if manifest.get(mesh_name) == mesh_inputs and bpy.data.collections.get(mesh_name) is not None:
+                print(f"{mesh_name} is up to date")
+                continue
+            remove_mesh_collection(mesh_name)
 
-        # Hide collection so that the blender file is easier to navigate
-        hide_col(collection)
+        create_mesh_collection(mesh_name, result_mesh_path, camera_data, args.materials, native_ply=args.native_ply,
+                               uv_cache_folder=UV_CACHE_FOLDER if args.uv_cache else None, uv_method=args.uv_method)
+        manifest[mesh_name] = mesh_inputs
+        nb_loaded += 1
 
-        bpy.ops.wm.save_mainfile(filepath=blend_file_path)
+        if args.checkpoint > 0 and nb_loaded % args.checkpoint == 0:
+            save(blend_file_path, manifest)
 
     if args.turntables:
         add_turntables(nb_frames=240)
 
-    bpy.ops.wm.save_mainfile(filepath=blend_file_path)
\ No newline at end of file
+    save(blend_file_path, manifest)
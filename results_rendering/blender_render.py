@@ -4,18 +4,169 @@ import math
 import os
 import argparse
 import re
+import json
+import subprocess
+import tempfile
+import traceback
+import threading
+import queue
 # import shutil
 
 # Add current directory to system path to be able to import scripts with python
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 
 from blender_utils import hide_all_in_collection
+from tracing import trace, enable_tracing, set_trace_context, trace_render_frames
 
 ROOT_FOLDER = os.path.dirname(os.path.realpath(__file__))
 OUT_FOLDER = os.path.join(ROOT_FOLDER, 'out')
 
 
-def render(output_path, camera, animation=False, resolution=1080, fps=24, frame_start=None, frame_end=None, ffmpeg=True):
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_END = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+
+# A frame is valid if its png file is complete (a killed render can leave a truncated file)
+def is_valid_png(path):
+    if not os.path.isfile(path) or os.path.getsize(path) < len(PNG_SIGNATURE) + len(PNG_END):
+        return False
+    with open(path, 'rb') as png_file:
+        if png_file.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            return False
+        png_file.seek(-len(PNG_END), os.SEEK_END)
+        return png_file.read() == PNG_END
+
+# Other formats (eg EXR) are only checked for existence
+def is_valid_frame(path):
+    if path.endswith('.png'):
+        return is_valid_png(path)
+    return os.path.isfile(path) and os.path.getsize(path) > 0
+
+# extra_outputs: other frame folders that must have every frame too (written by compositor File Output nodes)
+def get_missing_frames(scene, extra_outputs=()):
+    frames = range(scene.frame_start, scene.frame_end + 1, scene.frame_step)
+    return [frame for frame in frames if not is_valid_frame(scene.render.frame_path(frame=frame))
+            or not all(is_valid_png(os.path.join(folder, f"frame{frame:04d}.png")) for folder in extra_outputs)]
+
+# Group frames into runs of consecutive frames (for a given frame step), as (start, end) pairs
+def get_frame_runs(frames, step=1):
+    runs = []
+    for frame in frames:
+        if len(runs) > 0 and frame == runs[-1][1] + step:
+            runs[-1][1] = frame
+        else:
+            runs.append([frame, frame])
+    return runs
+
+def is_video_up_to_date(video_path, frames_folder):
+    if not os.path.isfile(video_path):
+        return False
+    frames = [os.path.join(frames_folder, f) for f in os.listdir(frames_folder) if f.endswith('.png')] if os.path.isdir(frames_folder) else []
+    return all(os.path.getmtime(video_path) > os.path.getmtime(f) for f in frames)
+
+# Encode frames with ffmpeg while the animation renders: each written frame is read from a render_write handler
+# and fed in order to the ffmpeg process through a bounded queue (the render waits if ffmpeg falls behind)
+# If ffmpeg stops early, the next frame (or the end of the render) raises instead of waiting forever
+class FfmpegStream:
+    def __init__(self, video_path, width, height, fps, keep_frames=True, queue_size=16):
+        self.keep_frames = keep_frames
+        command = [
+            'ffmpeg', '-y',
+            '-f', 'lavfi', '-i', f"color=c=white:s={width}x{height}:r={fps}",
+            '-f', 'image2pipe', '-c:v', 'png', '-framerate', str(fps), '-i', '-',
+            '-vcodec', 'libx264', '-filter_complex', '[0:v][1:v]overlay=shortest=1,format=yuv420p[out]', '-map', '[out]', '-r', '24',
+            video_path]
+        print(" ".join(command))
+        self.video_path = video_path
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.error = None
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.feeder = threading.Thread(target=self.feed, daemon=True)
+        self.feeder.start()
+
+    def feed(self):
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                frame_path, frame_data = frame
+                self.process.stdin.write(frame_data)
+                # Only deleted once ffmpeg has it
+                if not self.keep_frames:
+                    os.remove(frame_path)
+            self.process.stdin.close()
+        except OSError as e:
+            # Eg BrokenPipeError when ffmpeg exited
+            self.error = e
+
+    def is_running(self):
+        return self.error is None and self.feeder.is_alive()
+
+    def check(self):
+        if not self.is_running():
+            raise RuntimeError(f"ffmpeg stopped encoding {self.video_path} (exit code {self.process.poll()}): {self.error}")
+
+    # Wait for room in the queue, but give up if the feeder stopped
+    def put(self, frame):
+        while True:
+            self.check()
+            try:
+                self.frames.put(frame, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    # After a failure, the frames are left on disk (exceptions raised in handlers are only logged by Blender,
+    # the render stops at the end of the chunk, see render())
+    def on_render_write(self, scene, *args):
+        if not self.is_running():
+            return
+        frame_path = scene.render.frame_path(frame=scene.frame_current)
+        with open(frame_path, 'rb') as frame_file:
+            frame_data = frame_file.read()
+        try:
+            self.put((frame_path, frame_data))
+        except RuntimeError:
+            pass
+
+    def __enter__(self):
+        bpy.app.handlers.render_write.append(self.on_render_write)
+        return self
+
+    def __exit__(self, *exc):
+        bpy.app.handlers.render_write.remove(self.on_render_write)
+        if self.feeder.is_alive():
+            try:
+                self.put(None)
+            except RuntimeError:
+                pass
+        self.feeder.join()
+        if self.error is not None and self.process.poll() is None:
+            self.process.kill()
+        return_code = self.process.wait()
+        if return_code != 0 or self.error is not None:
+            raise RuntimeError(f"ffmpeg failed to encode {self.video_path} (exit code {return_code}): {self.error}")
+
+def encode_video(output_path, fps, resume=False):
+    output_video_path = os.path.join(output_path, os.pardir, os.path.basename(output_path) + '.mp4')
+    if resume and is_video_up_to_date(output_video_path, output_path):
+        print(f"{output_video_path} is up to date")
+        return
+
+    command = f"ffmpeg -y -f lavfi -i color=c=white:s={bpy.data.scenes['Scene'].render.resolution_x}x{bpy.data.scenes['Scene'].render.resolution_y}:r={fps} -pattern_type glob -framerate {fps} -i '{output_path}/*.png' -vcodec libx264 -filter_complex '[0:v][1:v]overlay=shortest=1,format=yuv420p[out]' -map '[out]' -r 24 {output_video_path}"
+    print(command)
+    stream = os.popen(command).read()
+
+    # Uncomment to have the frames deleted from disk automatically
+    # shutil.rmtree(output_path)
+
+# Frames rendered per render call when streaming to ffmpeg
+STREAM_CHUNK_FRAMES = 24
+
+# resume: only render the animation frames that are missing or invalid, and skip ffmpeg if the video is up to date
+# stream_ffmpeg: encode the video during the animation render (keep_frames=False to delete each png once encoded)
+# extra_outputs: frame folders of the other view layers, also checked by resume
+def render(output_path, camera, animation=False, resolution=1080, fps=24, frame_start=None, frame_end=None, ffmpeg=True, resume=False, stream_ffmpeg=False, keep_frames=True, extra_outputs=()):
     # output_path += '/'
     bpy.data.scenes['Scene'].render.filepath = output_path
     bpy.data.scenes['Scene'].camera = camera
@@ -40,20 +191,43 @@ def render(output_path, camera, animation=False, resolution=1080, fps=24, frame_
         step = bpy.data.scenes['Scene'].render.fps // fps
         bpy.data.scenes['Scene'].frame_step = step
 
-    bpy.ops.render.render(write_still = True, animation=animation)
+    output_video_path = os.path.join(output_path, os.pardir, os.path.basename(output_path) + '.mp4')
+
+    if animation and ffmpeg and stream_ffmpeg and not resume:
+        scene = bpy.data.scenes['Scene']
+        with FfmpegStream(os.path.normpath(output_video_path), scene.render.resolution_x, scene.render.resolution_y, fps, keep_frames=keep_frames) as stream:
+            # A render cannot be stopped from a handler: render in chunks, and stop after the chunk if ffmpeg failed
+            # instead of rendering the remaining frames for nothing
+            animation_start, animation_end = scene.frame_start, scene.frame_end
+            chunk_frames = STREAM_CHUNK_FRAMES * scene.frame_step
+            for chunk_start in range(animation_start, animation_end + 1, chunk_frames):
+                scene.frame_start = chunk_start
+                scene.frame_end = min(chunk_start + chunk_frames - 1, animation_end)
+                bpy.ops.render.render(write_still = True, animation=animation)
+                stream.check()
+        ffmpeg = False # Video is done already
+
+        if not keep_frames and os.path.isdir(output_path) and len(os.listdir(output_path)) == 0:
+            os.rmdir(output_path)
+
+    elif animation and resume:
+        scene = bpy.data.scenes['Scene']
+        missing_frames = get_missing_frames(scene, extra_outputs)
+        print(f"{len(missing_frames)} frame(s) to render in {output_path}")
+
+        for run_start, run_end in get_frame_runs(missing_frames, scene.frame_step):
+            scene.frame_start = run_start
+            scene.frame_end = run_end
+            bpy.ops.render.render(write_still = True, animation=animation)
+    else:
+        bpy.ops.render.render(write_still = True, animation=animation)
 
     # Put back values
     bpy.data.scenes['Scene'].frame_end = initial_frame_end
     bpy.data.scenes['Scene'].frame_start = initial_frame_start
 
     if ffmpeg:
-        output_video_path = os.path.join(output_path, os.pardir, os.path.basename(output_path) + '.mp4')
-        command = f"ffmpeg -f lavfi -i color=c=white:s={bpy.data.scenes['Scene'].render.resolution_x}x{bpy.data.scenes['Scene'].render.resolution_y}:r={fps} -pattern_type glob -framerate {fps} -i '{output_path}/*.png' -vcodec libx264 -filter_complex '[0:v][1:v]overlay=shortest=1,format=yuv420p[out]' -map '[out]' -r 24 {output_video_path}"
-        print(command)
-        stream = os.popen(command).read()
-
-        # Uncomment to have the frames deleted from disk automatically
-        # shutil.rmtree(output_path)
+        encode_video(output_path, fps, resume=resume)
 
 def compute_frame_bounds_turntables(initial_frame_start, initial_frame_end, rotation_start=0, rotation_end=360):
     # Adjust start/end frames
@@ -69,6 +243,305 @@ def compute_frame_bounds_turntables(initial_frame_start, initial_frame_end, rota
         print("ending at frame", frame_end)
     return frame_start, frame_end
 
+#### Single pass: one view layer per material (with a material override), all rendered by the same render call
+# Outputs are either one multilayer EXR per frame, or the usual per material PNGs: the first view layer is
+# written by the render itself (through the Composite node), the other ones by a compositor File Output node
+
+LAYER_PREFIX = "material_"
+
+def setup_material_layers(materials):
+    scene = bpy.data.scenes['Scene']
+    for view_layer in scene.view_layers:
+        view_layer.use = False
+
+    view_layers = []
+    for material in materials:
+        view_layer = scene.view_layers.get(LAYER_PREFIX + material) or scene.view_layers.new(LAYER_PREFIX + material)
+        view_layer.use = True
+        # 'default' (or an unknown material): no override, objects keep their own material
+        view_layer.material_override = bpy.data.materials.get(material)
+        view_layers.append(view_layer)
+    return view_layers
+
+def setup_layer_outputs(view_layers, out_path, names, animation):
+    scene = bpy.data.scenes['Scene']
+    scene.use_nodes = True
+    scene.render.use_compositing = True
+    tree = scene.node_tree
+
+    # Nodes of the previous job
+    for node in [node for node in tree.nodes if node.name.startswith(LAYER_PREFIX)]:
+        tree.nodes.remove(node)
+
+    composite = next((node for node in tree.nodes if node.type == 'COMPOSITE'), None)
+    if composite is None:
+        composite = tree.nodes.new("CompositorNodeComposite")
+        composite.name = LAYER_PREFIX + "composite"
+    file_output = tree.nodes.new("CompositorNodeOutputFile")
+    file_output.name = LAYER_PREFIX + "file_output"
+    file_output.base_path = out_path
+    file_output.format.file_format = 'PNG'
+    file_output.format.color_mode = 'RGBA'
+    file_output.file_slots.clear()
+
+    for i, (view_layer, name) in enumerate(zip(view_layers, names)):
+        layer_node = tree.nodes.new("CompositorNodeRLayers")
+        layer_node.name = LAYER_PREFIX + view_layer.name
+        layer_node.layer = view_layer.name
+        if i == 0:
+            tree.links.new(layer_node.outputs['Image'], composite.inputs['Image'])
+        else:
+            # Same layout as the render output: <name>/frame0001.png, or <name>0001.png for stills (renamed after the render)
+            file_output.file_slots.new(f"{name}/frame" if animation else name)
+            tree.links.new(layer_node.outputs['Image'], file_output.inputs[-1])
+
+# Socket linked to the image input of the Composite node, None if there is no node tree, Composite node or link
+def get_composite_source(scene):
+    if scene.node_tree is None:
+        return None
+    composite = next((node for node in scene.node_tree.nodes if node.type == 'COMPOSITE'), None)
+    if composite is None or not composite.inputs['Image'].is_linked:
+        return None
+    return composite.inputs['Image'].links[0].from_socket
+
+# Remove the nodes added by setup_layer_outputs and link the Composite node back to its initial source
+def remove_layer_outputs(scene, composite_source):
+    tree = scene.node_tree
+    if tree is None:
+        return
+    for node in [node for node in tree.nodes if node.name.startswith(LAYER_PREFIX)]:
+        tree.nodes.remove(node)
+
+    composite = next((node for node in tree.nodes if node.type == 'COMPOSITE'), None)
+    if composite is not None and composite_source is not None:
+        tree.links.new(composite_source, composite.inputs['Image'])
+
+# Returns the output path of every material (or of the EXR files)
+def render_material_layers(job, out_path, camera, animation=False, layers_format='PNG', fps=24, ffmpeg=False, resume=False, **render_options):
+    scene = bpy.data.scenes['Scene']
+    initial_use = {view_layer.name: view_layer.use for view_layer in scene.view_layers}
+    initial_file_format = scene.render.image_settings.file_format
+    initial_use_nodes = scene.use_nodes
+    initial_use_compositing = scene.render.use_compositing
+    initial_composite_source = get_composite_source(scene)
+
+    view_layers = setup_material_layers(job['materials'])
+    output_paths = [os.path.join(out_path, name) for name in job['names']]
+
+    try:
+        if layers_format == 'EXR':
+            if ffmpeg:
+                print("Videos are not encoded for EXR single pass renders, only the EXR files are written")
+            scene.render.image_settings.file_format = 'OPEN_EXR_MULTILAYER'
+            scene.use_nodes = False
+            output_path = os.path.join(out_path, job['name'])
+            render(output_path, camera, animation=animation, fps=fps, ffmpeg=False, resume=resume, **render_options)
+            return [output_path]
+
+        setup_layer_outputs(view_layers, out_path, job['names'], animation)
+        render(output_paths[0], camera, animation=animation, fps=fps, ffmpeg=ffmpeg, resume=resume, extra_outputs=output_paths[1:] if animation else (), **render_options)
+
+        if animation and ffmpeg:
+            for output_path in output_paths[1:]:
+                encode_video(output_path, fps, resume=resume)
+        elif not animation:
+            # File Output nodes always add the frame number
+            for output_path in output_paths[1:]:
+                os.replace(f"{output_path}{scene.frame_current:04d}.png", output_path + '.png')
+
+        return output_paths
+    finally:
+        for view_layer in scene.view_layers:
+            view_layer.use = initial_use.get(view_layer.name, False)
+        scene.render.image_settings.file_format = initial_file_format
+        remove_layer_outputs(scene, initial_composite_source)
+        scene.use_nodes = initial_use_nodes
+        scene.render.use_compositing = initial_use_compositing
+
+# Top level collections (= each mesh to render), Ignoring the default collection
+def get_mesh_collections():
+    return [c for c in bpy.data.scenes['Scene'].collection.children if len(c.objects) > 0 and c.name != 'Collection']
+
+# List every collection x camera x result object x material combination to render, in a stable order
+# (each job is a plain dict so that it can be sent to other processes)
+# single_pass: one job per collection x camera x result object, rendering all the materials at once
+def list_render_jobs(mesh_pattern, materials, turntables=False, single_pass=False):
+    jobs = []
+    for collection in get_mesh_collections():
+        mesh_name = collection.name
+        if not re.match(mesh_pattern, mesh_name):
+            continue
+
+        cameras = [obj for obj in collection.objects if obj.type == 'CAMERA']
+        res_objects = [ob for ob in collection.objects if re.match('.+_result', ob.name)]
+
+        for cam_idx, camera in enumerate(cameras):
+            # For turntables 1 camera is enough
+            if turntables and cam_idx > 0:
+                break
+
+            for idx, ob in enumerate(res_objects):
+                out_file_suffix = f"_{idx}" if len(res_objects) > 1 else ""
+
+                if single_pass:
+                    jobs.append({
+                        'collection': mesh_name,
+                        'camera': camera.name,
+                        'camera_index': cam_idx,
+                        'object': ob.name,
+                        'materials': list(materials),
+                        'names': [f"{mesh_name}_{cam_idx}{out_file_suffix}_{material}" for material in materials],
+                        'name': f"{mesh_name}_{cam_idx}{out_file_suffix}_layers",
+                    })
+                    continue
+
+                for material in materials:
+                    jobs.append({
+                        'collection': mesh_name,
+                        'camera': camera.name,
+                        'camera_index': cam_idx,
+                        'object': ob.name,
+                        'material': material,
+                        'name': f"{mesh_name}_{cam_idx}{out_file_suffix}_{material}",
+                    })
+    return jobs
+
+# Render one job, changing the scene settings (see run_render_job)
+def render_job(job, out_path, turntables=False, resolution=1080, fps=24, rotation_start=0, rotation_end=360, ffmpeg=False, resume=False, stream_ffmpeg=False, keep_frames=True, layers_format='PNG'):
+    collection = bpy.data.collections[job['collection']]
+    camera = bpy.data.objects[job['camera']]
+    ob = bpy.data.objects[job['object']]
+
+    # - Hide all other collections
+    for c in get_mesh_collections():
+        c.hide_render = True
+    collection.hide_render = False
+
+    hide_all_in_collection(collection)
+    ob.hide_render = False
+
+    set_trace_context(mesh=job['collection'], job=job['name'], vertices=len(ob.data.vertices), faces=len(ob.data.polygons))
+
+    frame_start, frame_end = compute_frame_bounds_turntables(
+        bpy.data.scenes['Scene'].frame_start,
+        bpy.data.scenes['Scene'].frame_end,
+        rotation_start=rotation_start,
+        rotation_end=rotation_end
+    )
+
+    if 'materials' in job:
+        if stream_ffmpeg:
+            print("Streaming to ffmpeg is not supported for single pass jobs, videos are encoded after the render")
+        output_paths = render_material_layers(
+            job,
+            out_path,
+            camera,
+            animation=turntables,
+            layers_format=layers_format,
+            fps=fps,
+            ffmpeg=ffmpeg,
+            resume=resume,
+            resolution=resolution,
+            frame_start=frame_start,
+            frame_end=frame_end)
+        ob.hide_render = True
+        return output_paths
+
+    material = job['material']
+    if bpy.data.materials.get(material):
+        ob.active_material = bpy.data.materials[material]
+    elif material == 'default':
+        print(f"Using default material to render {ob.active_material}")
+
+    output_path = os.path.join(out_path, job['name'])
+    render(
+        output_path,
+        camera,
+        animation=turntables,
+        resolution=resolution,
+        fps=fps,
+        frame_start=frame_start,
+        frame_end=frame_end,
+        ffmpeg=ffmpeg,
+        resume=resume,
+        stream_ffmpeg=stream_ffmpeg,
+        keep_frames=keep_frames)
+
+    ob.hide_render = True
+
+    return output_path
+
+# Scene settings changed by render jobs (render() scales the resolution, sets the frame step and output path...)
+JOB_RENDER_SETTINGS = ('filepath', 'resolution_x', 'resolution_y')
+JOB_SCENE_SETTINGS = ('camera', 'frame_start', 'frame_end', 'frame_step')
+
+# Returns the output path (the list of output paths for single pass jobs).
+# The scene settings and the material of the object are put back afterwards, so the next job in the same Blender
+# (eg in the render daemon) starts from the same scene
+def run_render_job(job, out_path, **render_options):
+    scene = bpy.data.scenes['Scene']
+    ob = bpy.data.objects[job['object']]
+    initial_render_settings = {name: getattr(scene.render, name) for name in JOB_RENDER_SETTINGS}
+    initial_scene_settings = {name: getattr(scene, name) for name in JOB_SCENE_SETTINGS}
+    initial_material = ob.active_material
+
+    try:
+        return render_job(job, out_path, **render_options)
+    finally:
+        for name, value in initial_render_settings.items():
+            setattr(scene.render, name, value)
+        for name, value in initial_scene_settings.items():
+            setattr(scene, name, value)
+        ob.active_material = initial_material
+
+# Render the jobs one after the other, failures are reported and do not stop the other jobs
+def run_render_jobs(jobs, out_path, **render_options):
+    results = []
+    for job in jobs:
+        print(f"Rendering {job['name']}")
+        try:
+            with trace("render_job"):
+                output_path = run_render_job(job, out_path, **render_options)
+            results.append({'job': job['name'], 'status': 'done', 'output': output_path})
+        except Exception:
+            traceback.print_exc()
+            results.append({'job': job['name'], 'status': 'failed', 'error': traceback.format_exc()})
+    return results
+
+# Driver: launch one background Blender per shard, each renders jobs[shard::nb_workers]
+def render_in_workers(nb_workers, script_argv, nb_jobs):
+    # Share the CPU threads between workers
+    threads = max(1, (os.cpu_count() or 1) // nb_workers)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="blender_render_") as report_folder:
+        workers = []
+        for shard in range(min(nb_workers, nb_jobs)):
+            report_path = os.path.join(report_folder, f"shard_{shard}.json")
+            command = [bpy.app.binary_path, '-b', '-t', str(threads), '--python', os.path.realpath(__file__), '--'] + script_argv + ['--shard', str(shard), '--shard-report', report_path]
+            print(" ".join(command))
+            workers.append((shard, report_path, subprocess.Popen(command)))
+
+        for shard, report_path, process in workers:
+            return_code = process.wait()
+            if os.path.isfile(report_path):
+                with open(report_path) as report_file:
+                    results.extend(json.load(report_file))
+            if return_code != 0:
+                results.append({'job': f"shard {shard}", 'status': 'failed', 'error': f"worker exited with code {return_code}"})
+
+    return results
+
+# Returns True if every job was rendered
+def print_summary(results, nb_jobs):
+    done = [r for r in results if r['status'] == 'done']
+    failed = [r for r in results if r['status'] == 'failed']
+    print(f"Rendered {len(done)}/{nb_jobs} jobs, {len(failed)} failure(s)")
+    for r in failed:
+        print(f"- FAILED {r['job']}: {r['error'].strip().splitlines()[-1]}")
+    return len(failed) == 0 and len(done) == nb_jobs
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
@@ -82,6 +555,15 @@ if __name__ == "__main__":
     parser.add_argument('--fps', help='FPS (probably better to choose a divisor/multiple of 24)', dest='fps', type=int, default=24)
     parser.add_argument('--rot', help='How many degrees of rotation (default = 360, full turn)', dest='rotation', type=int, default=360)
     parser.add_argument('--rot-start', help='Angle of start of rotation (degrees, default = 0)', dest='rotation_start', type=int, default=0)
+    parser.add_argument('--stream-ffmpeg', help='Encode videos while rendering turntables (with --ffmpeg)', dest='stream_ffmpeg', action='store_true', default=False)
+    parser.add_argument('--no-frames', help='Do not keep the turntable frames on disk once encoded (implies --ffmpeg --stream-ffmpeg, cannot be used with --resume)', dest='no_frames', action='store_true', default=False)
+    parser.add_argument('--resume', help='Only render the turntable frames that are missing or invalid in the output folder (and skip up to date videos)', dest='resume', action='store_true', default=False)
+    parser.add_argument('--single-pass', help='Render all the materials in one render call per camera/frame (one view layer with a material override per material)', dest='single_pass', action='store_true', default=False)
+    parser.add_argument('--layers-format', help='Output of --single-pass: PNG (one image per material, as usual) or EXR (one multilayer EXR)', dest='layers_format', type=str.upper, choices=['PNG', 'EXR'], default='PNG')
+    parser.add_argument('--trace', help='Write per-stage and per-frame timings and memory use to this JSON lines file (summarize with tracing.py)', dest='trace', type=str, default=None)
+    parser.add_argument('-j', '--workers', help='Number of background Blender processes to render with (default = 1, render in this process)', type=int, default=1)
+    parser.add_argument('--shard', help=argparse.SUPPRESS, type=int, default=None)
+    parser.add_argument('--shard-report', help=argparse.SUPPRESS, type=str, default=None)
 
     # get the args passed to blender after "--", all of which are ignored by
     # blender so scripts may receive their own arguments
@@ -93,6 +575,10 @@ if __name__ == "__main__":
 
     args = parser.parse_args(argv)
 
+    if args.no_frames and args.resume:
+        # Resuming renders the missing frames only, then encodes the video from the frames on disk
+        parser.error("--no-frames cannot be used with --resume")
+
     blend_file_path = os.path.join(OUT_FOLDER, f"{args.blend_file}.blend")
 
     base_path = OUT_FOLDER
@@ -103,66 +589,53 @@ if __name__ == "__main__":
         out_path = os.path.join(base_path, args.out_folder)
     
 
-    bpy.ops.wm.open_mainfile(filepath=blend_file_path)
-
-    # For each top level collection (= each mesh to render), Ignoring the default collection
-    all_collections = [c for c in bpy.data.scenes['Scene'].collection.children if len(c.objects) > 0 and c.name != 'Collection']
-
-    print("Rendering collections:")
-    print(all_collections)
-
-
-    for collection in all_collections:
-        mesh_name = collection.name
-        if re.match(args.mesh, mesh_name):
-            # - Hide all other collections
-            for c in all_collections:
-                c.hide_render = True
-
-            collection.hide_render = False
+    if args.trace is not None:
+        enable_tracing(args.trace)
+
+    with trace("open_mainfile", mesh=os.path.basename(blend_file_path)):
+        bpy.ops.wm.open_mainfile(filepath=blend_file_path)
+
+    if args.trace is not None:
+        # After loading the file, which resets the handlers
+        trace_render_frames()
+
+    if len(args.materials) == 0:
+        args.materials = ["shiny"]
+
+    if args.no_frames:
+        args.ffmpeg = True
+        args.stream_ffmpeg = True
+
+    jobs = list_render_jobs(args.mesh, args.materials, turntables=args.turntables, single_pass=args.single_pass)
+
+    render_options = dict(
+        turntables=args.turntables,
+        resolution=args.resolution,
+        fps=args.fps,
+        rotation_start=args.rotation_start,
+        rotation_end=args.rotation,
+        ffmpeg=args.ffmpeg,
+        resume=args.resume,
+        stream_ffmpeg=args.stream_ffmpeg,
+        keep_frames=not args.no_frames,
+        layers_format=args.layers_format)
+
+    if args.shard is not None:
+        # Worker: render only this shard and report back to the driver
+        results = run_render_jobs(jobs[args.shard::args.workers], out_path, **render_options)
+        with open(args.shard_report, 'w') as report_file:
+            json.dump(results, report_file)
+
+    elif args.workers > 1:
+        print(f"Rendering {len(jobs)} jobs with {args.workers} workers")
+        results = render_in_workers(args.workers, argv, len(jobs))
+        if not print_summary(results, len(jobs)):
+            sys.exit(1)
 
-            cameras = [obj for obj in collection.objects if obj.type == 'CAMERA']
-
-            res_objects = [ob for ob in collection.objects if re.match('.+_result', ob.name)]
-            hide_all_in_collection(collection)
-
-            # - For each camera
-            for cam_idx, camera in enumerate(cameras):
-                # For turntables 1 camera is enough
-                if args.turntables and cam_idx > 0:
-                    break
-
-                for idx, ob in enumerate(res_objects):
-
-                    ob.hide_render = False
-
-                    out_file_suffix = f"_{idx}" if len(res_objects) > 1 else ""
-
-                    if len(args.materials) == 0:
-                        args.materials = ["shiny"]
-
-                    for material in args.materials:
-                        if bpy.data.materials.get(material):
-                            ob.active_material = bpy.data.materials[material]
-                        elif material == 'default':
-                            print(f"Using default material to render {ob.active_material}")
-
-                        frame_start, frame_end = compute_frame_bounds_turntables(
-                            bpy.data.scenes['Scene'].frame_start,
-                            bpy.data.scenes['Scene'].frame_end,
-                            rotation_start=args.rotation_start,
-                            rotation_end=args.rotation
-                        )
-
-                        render(
-                            os.path.join(out_path, f"{mesh_name}_{cam_idx}{out_file_suffix}_{material}"), 
-                            camera, 
-                            animation=args.turntables, 
-                            resolution=args.resolution, 
-                            fps=args.fps,
-                            frame_start=frame_start,
-                            frame_end=frame_end,
-                            ffmpeg=args.ffmpeg) 
-
-                    ob.hide_render = True                    
+    else:
+        print("Rendering jobs:")
+        print([job['name'] for job in jobs])
 
+        results = run_render_jobs(jobs, out_path, **render_options)
+        if not print_summary(results, len(jobs)):
+            sys.exit(1)
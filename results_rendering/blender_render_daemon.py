@@ -0,0 +1,179 @@
+import bpy
+import sys
+import os
+import argparse
+import json
+import socket
+import tempfile
+import traceback
+
+# Add current directory to system path to be able to import scripts with python
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from blender_render import OUT_FOLDER, list_render_jobs, run_render_job
+from tracing import trace, enable_tracing, trace_render_frames
+
+##### Render daemon: load the blend file once and render the jobs sent on a local Unix socket with the warm scene
+# blender -b --python blender_render_daemon.py -- --blend-file all_meshes
+# Submit jobs with render_client.py
+#
+# Protocol: JSON lines. The client sends one request per line, with the same fields as the blender_render.py options:
+# {"mesh": ".+", "camera": 0, "materials": ["shiny"], "resolution": 1080, "frame_start": 1, "frame_end": 240,
+#  "turntables": false, "single_pass": false, "layers_format": "PNG", "fps": 24, "ffmpeg": false, "resume": false, "out_folder": null}
+# (all optional; "material" is accepted for a single material) or {"command": "shutdown"}.
+# The daemon answers with one message per line: "queued" (job names), then "started" and "done" (output path) or
+# "failed" (error) for each job, and "finished" once the request is complete (or "error" if it could not be run)
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "blender_render.sock")
+
+REQUEST_FIELDS = {'mesh', 'camera', 'material', 'materials', 'resolution', 'frame_start', 'frame_end', 'turntables', 'single_pass', 'layers_format', 'fps', 'ffmpeg', 'resume', 'out_folder'}
+
+
+def send(connection, message):
+    connection.sendall((json.dumps(message) + "\n").encode('utf-8'))
+
+def get_request_jobs(request):
+    unknown_fields = set(request) - REQUEST_FIELDS
+    if len(unknown_fields) > 0:
+        raise ValueError(f"Unknown request field(s): {', '.join(sorted(unknown_fields))}")
+
+    materials = request.get('materials') or [request.get('material', 'shiny')]
+    jobs = list_render_jobs(request.get('mesh', '.+'), materials, turntables=request.get('turntables', False), single_pass=request.get('single_pass', False))
+    if request.get('camera') is not None:
+        jobs = [job for job in jobs if job['camera_index'] == request['camera']]
+    return jobs
+
+def run_request(request, connection, out_path):
+    jobs = get_request_jobs(request)
+    send(connection, {'status': 'queued', 'jobs': [job['name'] for job in jobs]})
+
+    if request.get('out_folder') is not None:
+        out_path = os.path.join(OUT_FOLDER, request['out_folder'])
+
+    render_options = dict(
+        turntables=request.get('turntables', False),
+        resolution=request.get('resolution', 1080),
+        fps=request.get('fps', 24),
+        ffmpeg=request.get('ffmpeg', False),
+        resume=request.get('resume', False),
+        layers_format=request.get('layers_format', 'PNG'))
+
+    # Explicit frame range: set on the scene for the duration of the request (the turntable bounds are computed from it)
+    scene = bpy.data.scenes['Scene']
+    initial_frame_start, initial_frame_end = scene.frame_start, scene.frame_end
+    scene.frame_start = request.get('frame_start', scene.frame_start)
+    scene.frame_end = request.get('frame_end', scene.frame_end)
+
+    nb_done = 0
+    try:
+        for job in jobs:
+            send(connection, {'status': 'started', 'job': job['name']})
+            try:
+                with trace("render_job"):
+                    output_path = run_render_job(job, out_path, **render_options)
+                nb_done += 1
+                send(connection, {'status': 'done', 'job': job['name'], 'output': output_path})
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception:
+                traceback.print_exc()
+                send(connection, {'status': 'failed', 'job': job['name'], 'error': traceback.format_exc()})
+    finally:
+        scene.frame_start, scene.frame_end = initial_frame_start, initial_frame_end
+
+    send(connection, {'status': 'finished', 'done': nb_done, 'failed': len(jobs) - nb_done})
+
+# Handle the requests of one client, returns False if the daemon should stop
+def serve_client(connection, out_path):
+    with connection, connection.makefile('r', encoding='utf-8') as requests:
+        for line in requests:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if request.get('command') == 'shutdown':
+                    send(connection, {'status': 'shutdown'})
+                    return False
+                run_request(request, connection, out_path)
+            except (BrokenPipeError, ConnectionResetError):
+                print("Client disconnected")
+                return True
+            except Exception as e:
+                traceback.print_exc()
+                try:
+                    send(connection, {'status': 'error', 'error': str(e)})
+                except (BrokenPipeError, ConnectionResetError):
+                    print("Client disconnected")
+                    return True
+    return True
+
+# True if a daemon is listening on the socket
+def is_daemon_running(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+            return True
+        except OSError:
+            return False
+
+def serve(socket_path, out_path):
+    if os.path.exists(socket_path):
+        if is_daemon_running(socket_path):
+            raise RuntimeError(f"A daemon is already listening on {socket_path}, stop it first (render_client.py --shutdown) or use another --socket")
+        # Left by a previous daemon that did not stop cleanly
+        os.remove(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen()
+    print(f"Listening on {socket_path}")
+
+    try:
+        # Blender is not thread safe: clients are served one after the other, in the main thread
+        while True:
+            connection, _ = server.accept()
+            if not serve_client(connection, out_path):
+                break
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--blend-file', help='Name of the blend file', type=str, default=None, required=True)
+    parser.add_argument('--out-folder', help='Name of the default output folder', type=str, default=None, required=False)
+    parser.add_argument('--socket', help='Path of the Unix socket to listen on', dest='socket_path', type=str, default=DEFAULT_SOCKET_PATH)
+    parser.add_argument('--trace', help='Write per-stage and per-frame timings and memory use to this JSON lines file (summarize with tracing.py)', dest='trace', type=str, default=None)
+
+    # get the args passed to blender after "--", all of which are ignored by
+    # blender so scripts may receive their own arguments
+    argv = sys.argv
+    if "--" not in argv:
+        argv = []  # as if no args are passed
+    else:
+        argv = argv[argv.index("--") + 1:]  # get all args after "--"
+
+    args = parser.parse_args(argv)
+
+    # Before loading the blend file, which can take a while
+    if is_daemon_running(args.socket_path):
+        print(f"A daemon is already listening on {args.socket_path}, stop it first (render_client.py --shutdown) or use another --socket")
+        sys.exit(1)
+
+    blend_file_path = os.path.join(OUT_FOLDER, f"{args.blend_file}.blend")
+    out_path = os.path.join(OUT_FOLDER, args.out_folder if args.out_folder is not None else args.blend_file)
+
+    if args.trace is not None:
+        enable_tracing(args.trace)
+
+    with trace("open_mainfile", mesh=os.path.basename(blend_file_path)):
+        bpy.ops.wm.open_mainfile(filepath=blend_file_path)
+
+    if args.trace is not None:
+        # After loading the file, which resets the handlers
+        trace_render_frames()
+
+    serve(args.socket_path, out_path)
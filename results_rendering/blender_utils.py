@@ -2,6 +2,8 @@ import bpy
 import bmesh
 import numpy as np
 import os
+import glob
+import hashlib
 from mathutils import Matrix, Vector, Euler
 from math import pi
 
@@ -44,22 +46,31 @@ def add_turntables(nb_frames=240):
     scene.frame_end = nb_frames
     scene.render.fps = 24
 
-    # Create empty
-    bpy.ops.object.empty_add(type="PLAIN_AXES")
-    empty = bpy.context.object
-    bpy.ops.collection.objects_remove_all()
-    # add it to the default collection
-    bpy.data.collections['Collection'].objects.link(empty)
-
-    # Set keyframes for rotation
-    empty.keyframe_insert(data_path="rotation_euler", frame=1)
-    empty.rotation_euler = Euler((0, 0, 2 * pi), 'XYZ')
-    empty.keyframe_insert(data_path="rotation_euler", frame=nb_frames + 1)
-
-    fcurves = empty.animation_data.action.fcurves
-    for fcurve in fcurves:
-        for kf in fcurve.keyframe_points:
-            kf.interpolation = 'LINEAR'
+    # Reuse the turntable of the scene if there is one already (eg when updating an existing blend file)
+    empty = bpy.data.objects.get("turntable")
+    if empty is None:
+        # Blend files made before the empty was named are using the default name
+        empty = bpy.data.objects.get("Empty")
+        if empty is not None and (empty.type != 'EMPTY' or empty.animation_data is None):
+            empty = None
+    if empty is None:
+        # Create empty
+        bpy.ops.object.empty_add(type="PLAIN_AXES")
+        empty = bpy.context.object
+        empty.name = "turntable"
+        bpy.ops.collection.objects_remove_all()
+        # add it to the default collection
+        bpy.data.collections['Collection'].objects.link(empty)
+
+        # Set keyframes for rotation
+        empty.keyframe_insert(data_path="rotation_euler", frame=1)
+        empty.rotation_euler = Euler((0, 0, 2 * pi), 'XYZ')
+        empty.keyframe_insert(data_path="rotation_euler", frame=nb_frames + 1)
+
+        fcurves = empty.animation_data.action.fcurves
+        for fcurve in fcurves:
+            for kf in fcurve.keyframe_points:
+                kf.interpolation = 'LINEAR'
 
     # Parent all non camera objects of the scene to the empty
     for ob in bpy.data.objects:
@@ -68,17 +79,41 @@ def add_turntables(nb_frames=240):
 
             
 
+# Materials loaded from MATERIALS_BLEND_FILE, by requested name
+loaded_materials = {}
+
+def get_cached_mat(mat_name):
+    mat = loaded_materials.get(mat_name)
+    if mat is not None:
+        try:
+            mat.name
+            return mat
+        except ReferenceError:
+            # Removed since (eg a new file was loaded)
+            del loaded_materials[mat_name]
+    return bpy.data.materials.get(mat_name)
+
+# Append all the requested materials in one pass over the materials library (no operator needed)
+def load_materials(mat_names):
+    missing = [name for name in mat_names if get_cached_mat(name) is None]
+    if len(missing) > 0:
+        with bpy.data.libraries.load(MATERIALS_BLEND_FILE, link=False) as (data_from, data_to):
+            data_to.materials = [name for name in missing if name in data_from.materials]
+            not_found = [name for name in missing if name not in data_from.materials]
+
+        for mat in data_to.materials:
+            if mat is not None:
+                loaded_materials[mat.name] = mat
+        for name in not_found:
+            print(f"Material {name} not found in {MATERIALS_BLEND_FILE}")
+
+    return [get_cached_mat(name) for name in mat_names]
+
 def get_or_load_mat(mat_name):
-    if bpy.data.materials.get(mat_name):
-        return bpy.data.materials[mat_name]
-    else:
-        return load_mat(mat_name)
+    return load_materials([mat_name])[0]
 
 def load_mat(mat_name):
-    path = MATERIALS_BLEND_FILE + "\\Material\\"
-    bpy.ops.wm.append(filename=mat_name, directory=path)
-    mat = bpy.data.materials.get(mat_name)
-    return mat
+    return load_materials([mat_name])[0]
 
 def create_camera(name, position, rotation):
     bpy.ops.object.camera_add(location=position)
@@ -87,19 +122,104 @@ def create_camera(name, position, rotation):
 
     return bpy.context.object
 
-def add_mesh(V, F, name, collection='Collection'):
-    mesh = bpy.data.meshes.new(name)
+# V: n x 3 array, F: m x k array (triangles, quads...), a list of faces of different sizes (as from_pydata takes)
+# or, with face_offsets, flat vertex indices of all faces with face i made of F[face_offsets[i]:face_offsets[i + 1]] (n-gons)
+# vertex_attributes / face_attributes: {name: array} written in the same call (see set_attribute)
+def add_mesh(V, F, name, collection='Collection', face_offsets=None, vertex_attributes=None, face_attributes=None):
+    mesh = new_mesh_from_arrays(name, V, F, face_offsets=face_offsets, vertex_attributes=vertex_attributes, face_attributes=face_attributes, validate=False)
     new_obj = bpy.data.objects.new(name, mesh)
     col = bpy.data.collections.get(collection)
     if col is None:
         col = bpy.data.collections.new(collection)
     col.objects.link(new_obj)
-    V = list(map(tuple, V))
-    F = list(map(tuple, F))
-    mesh.from_pydata(V, [], F)
 
     return new_obj
 
+# Create a mesh from NumPy arrays with bulk setters (no conversion to Python tuples, arrays are only copied if their dtype differs)
+# vertex_colors: per-vertex colors stored in a per-loop color layer, as the PLY importer does
+# Out of range indices raise a ValueError. Keep validate=True for data read from files (validate=False saves memory on large meshes)
+def new_mesh_from_arrays(name, V, F, vertex_colors=None, color_layer_name="Col", face_offsets=None, vertex_attributes=None, face_attributes=None, validate=True):
+    V = np.ascontiguousarray(V, dtype=np.float32)
+
+    if face_offsets is None and not isinstance(F, np.ndarray) and len(set(len(face) for face in F)) > 1:
+        # List of faces of different sizes
+        face_offsets = np.concatenate([[0], np.cumsum([len(face) for face in F])])
+        F = np.concatenate([np.asarray(face) for face in F])
+
+    if face_offsets is None:
+        F = np.asarray(F)
+        nb_faces, face_size = F.shape
+        loop_vertices = np.ascontiguousarray(F, dtype=np.int32).ravel()
+        loop_starts = np.arange(0, nb_faces * face_size, face_size, dtype=np.int32)
+        loop_totals = np.full(nb_faces, face_size, dtype=np.int32)
+    else:
+        face_offsets = np.asarray(face_offsets)
+        loop_vertices = np.ascontiguousarray(F, dtype=np.int32).ravel()
+        loop_starts = np.ascontiguousarray(face_offsets[:-1], dtype=np.int32)
+        loop_totals = np.diff(face_offsets).astype(np.int32)
+        if face_offsets[-1] != len(loop_vertices):
+            raise ValueError(f"Mesh {name}: face offsets end at {face_offsets[-1]} but there are {len(loop_vertices)} face indices")
+
+    if len(loop_vertices) > 0 and (loop_vertices.min() < 0 or loop_vertices.max() >= len(V)):
+        raise ValueError(f"Mesh {name}: face vertex indices out of range (mesh has {len(V)} vertices)")
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(V))
+    mesh.loops.add(len(loop_vertices))
+    mesh.polygons.add(len(loop_starts))
+
+    mesh.vertices.foreach_set("co", V.ravel())
+    mesh.loops.foreach_set("vertex_index", loop_vertices)
+    mesh.polygons.foreach_set("loop_start", loop_starts)
+    mesh.polygons.foreach_set("loop_total", loop_totals)
+
+    mesh.update(calc_edges=True)
+
+    if vertex_colors is not None:
+        loop_colors = np.ones((len(loop_vertices), 4), dtype=np.float32)
+        loop_colors[:, :3] = np.asarray(vertex_colors)[loop_vertices, :3]
+        color_layer = mesh.vertex_colors.new(name=color_layer_name)
+        color_layer.data.foreach_set("color", loop_colors.ravel())
+
+    for attribute_name, values in (vertex_attributes or {}).items():
+        set_attribute(mesh, attribute_name, values, 'POINT')
+    for attribute_name, values in (face_attributes or {}).items():
+        set_attribute(mesh, attribute_name, values, 'FACE')
+
+    # After writing the colors and attributes: they are indexed like the input faces and loops,
+    # validate removes their values together with the invalid (eg degenerate) faces it drops
+    if validate:
+        mesh.validate()
+
+    return mesh
+
+# Write a generic attribute in one bulk set: n x 3 or n x 4 arrays are colors, 1D arrays are float/int/boolean values
+def set_attribute(mesh, name, values, domain='POINT'):
+    values = np.asarray(values)
+    if values.ndim == 2:
+        attribute_type, key = 'FLOAT_COLOR', "color"
+        if values.shape[1] == 3:
+            values = np.column_stack([values, np.ones(len(values))])
+        values = np.asarray(values, dtype=np.float32)
+    elif values.dtype == bool:
+        attribute_type, key = 'BOOLEAN', "value"
+    elif values.dtype.kind in 'iu':
+        attribute_type, key = 'INT', "value"
+        values = np.asarray(values, dtype=np.int32)
+    else:
+        attribute_type, key = 'FLOAT', "value"
+        values = np.asarray(values, dtype=np.float32)
+
+    attribute = mesh.attributes.get(name)
+    if attribute is not None and (attribute.data_type != attribute_type or attribute.domain != domain):
+        mesh.attributes.remove(attribute)
+        attribute = None
+    if attribute is None:
+        attribute = mesh.attributes.new(name=name, type=attribute_type, domain=domain)
+
+    attribute.data.foreach_set(key, values.ravel())
+    return attribute
+
 def set_collection(ob, new_collection):
     old_coll = ob.users_collection #list of all collection the obj is in
 
@@ -121,77 +241,72 @@ def hide_all_in_collection(col):
     for ob in col.objects:
         ob.hide_render = True
 
+# Polygon index and loop index of every face corner, in polygon order
+def get_corner_loops(mesh):
+    nb_polys = len(mesh.polygons)
+    loop_starts = np.empty(nb_polys, dtype=np.int32)
+    loop_totals = np.empty(nb_polys, dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loop_starts)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+
+    poly_by_corner = np.repeat(np.arange(nb_polys), loop_totals)
+    first_corner = np.cumsum(loop_totals) - loop_totals
+    corner_loops = np.repeat(loop_starts - first_corner, loop_totals) + np.arange(len(poly_by_corner))
+
+    return poly_by_corner, corner_loops
+
 def set_per_face_colors(ob, colors_by_face, label):
 
     color_layer = ob.data.vertex_colors.get(label) or ob.data.vertex_colors.new(name=label)
 
-    for poly, color in zip(ob.data.polygons, colors_by_face):
-        # for idx in poly.loop_indices:
-        for i, index in enumerate(poly.vertices):
-            loop_index = poly.loop_indices[i]
-            color_layer.data[loop_index].color[0] = color[0]
-            color_layer.data[loop_index].color[1] = color[1]
-            color_layer.data[loop_index].color[2] = color[2]
-            color_layer.data[loop_index].color[3] = 1 # set alpha
+    # Expand face colors to every loop of the face (works for any polygon size), alpha = 1
+    poly_by_corner, corner_loops = get_corner_loops(ob.data)
+    colors_by_face = np.asarray(colors_by_face)
 
-def mark_sharp(ob, vertex_is_sharp):
-    # Make sure all mesh elements are deselected first
-    bpy.context.view_layer.objects.active = ob
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
+    loop_colors = np.ones((len(ob.data.loops), 4), dtype=np.float32)
+    loop_colors[corner_loops, :3] = colors_by_face[poly_by_corner, :3]
 
-    for e in ob.data.edges:
-        if np.all(vertex_is_sharp[e.vertices]):
-            # Mark as sharp
-            e.select = True
-        else:
-            e.select = False
-    
-    bpy.ops.object.mode_set(mode='EDIT')
+    color_layer.data.foreach_set("color", loop_colors.ravel())
 
-    bpy.ops.mesh.select_all(action='INVERT')
-    bpy.ops.mesh.mark_sharp(clear=True)
-    bpy.ops.mesh.select_all(action='INVERT')
-    bpy.ops.mesh.mark_sharp()
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
+# Mark edges whose 2 vertices are sharp (resp. seam) as sharp (resp. UV seam)
+# Flags are written directly on the mesh data: no mode switch, no selection change, no operator
+# Pass None to leave the sharp or seam flags untouched
+def mark_sharp_and_seam(ob, vertex_is_sharp=None, vertex_is_seam=None, edge_split=True):
+    mesh = ob.data
 
-    # Add modifier to render sharp edges correctly
-    bpy.ops.object.modifier_add(type='EDGE_SPLIT')
-    bpy.context.object.modifiers["EdgeSplit"].use_edge_angle = False
+    nb_edges = len(mesh.edges)
+    edge_vertices = np.empty(nb_edges * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edge_vertices)
+    edge_vertices.shape = (nb_edges, 2)
 
-    # Shade smooth
-    ob.select_set(True)
-    bpy.ops.object.shade_smooth()
-    ob.select_set(False)
+    if vertex_is_sharp is not None:
+        edge_is_sharp = np.all(np.asarray(vertex_is_sharp)[edge_vertices], axis=1)
+        mesh.edges.foreach_set("use_edge_sharp", edge_is_sharp)
 
+        if edge_split:
+            # Add modifier to render sharp edges correctly
+            add_edge_split(ob)
 
-def mark_seam(ob, vertex_is_seam):
-    # Make sure all mesh elements are deselected first
-    bpy.context.view_layer.objects.active = ob
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
+        # Shade smooth
+        mesh.polygons.foreach_set("use_smooth", np.ones(len(mesh.polygons), dtype=bool))
 
-    # Mark segmentation seams as UV seams
-    for e in ob.data.edges:
-        if np.all(vertex_is_seam[e.vertices]):
-            # Mark as sharp
-            e.select = True
-        else:
-            e.select = False
+    if vertex_is_seam is not None:
+        edge_is_seam = np.all(np.asarray(vertex_is_seam)[edge_vertices], axis=1)
+        mesh.edges.foreach_set("use_seam", edge_is_seam)
 
-    bpy.ops.object.mode_set(mode='EDIT')
+    mesh.update()
 
-    bpy.ops.mesh.select_all(action='INVERT')
-    # bpy.ops.mesh.mark_sharp(clear=True)
-    bpy.ops.mesh.mark_seam(clear=True)
-    bpy.ops.mesh.select_all(action='INVERT')
-    # bpy.ops.mesh.mark_sharp()
-    bpy.ops.mesh.mark_seam()
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
+def add_edge_split(ob):
+    modifier = ob.modifiers.get("EdgeSplit") or ob.modifiers.new(name="EdgeSplit", type='EDGE_SPLIT')
+    modifier.use_edge_angle = False
+    modifier.use_edge_sharp = True
+    return modifier
+
+def mark_sharp(ob, vertex_is_sharp):
+    mark_sharp_and_seam(ob, vertex_is_sharp=vertex_is_sharp)
+
+def mark_seam(ob, vertex_is_seam):
+    mark_sharp_and_seam(ob, vertex_is_seam=vertex_is_seam)
 
 
 def uv_unwrap(ob):
@@ -201,4 +316,158 @@ def uv_unwrap(ob):
     bpy.ops.mesh.select_all()
     bpy.ops.uv.unwrap(method='ANGLE_BASED', margin=0.001)
     bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
\ No newline at end of file
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+#### UV cache: unwrapped UVs only depend on the geometry and the seams, store them in a sidecar array
+# (one .npy file of per-loop UVs per mesh, keyed by the hash of the geometry and seams) and restore them with a bulk set
+
+def get_seam_hash(mesh):
+    h = hashlib.sha1()
+    for collection, key, dtype, size in [
+            (mesh.vertices, "co", np.float32, 3),
+            (mesh.loops, "vertex_index", np.int32, 1),
+            (mesh.edges, "vertices", np.int32, 2),
+            (mesh.edges, "use_seam", bool, 1)]:
+        values = np.empty(len(collection) * size, dtype=dtype)
+        collection.foreach_get(key, values)
+        h.update(values.tobytes())
+    return h.hexdigest()
+
+def get_loop_uvs(mesh):
+    loop_uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get("uv", loop_uvs)
+    return loop_uvs.reshape(-1, 2)
+
+def set_loop_uvs(mesh, loop_uvs):
+    uv_layer = mesh.uv_layers.active or mesh.uv_layers.new(name="UVMap")
+    uv_layer.data.foreach_set("uv", np.ascontiguousarray(loop_uvs, dtype=np.float32).ravel())
+    mesh.update()
+
+# method: 'ANGLE_BASED' (unwrap operator) or 'FAST' (fast_uv_unwrap)
+# Returns True if the UVs were restored from the cache
+def cached_uv_unwrap(ob, cache_folder, name=None, method='ANGLE_BASED'):
+    name = name or ob.data.name
+    cache_prefix = os.path.join(cache_folder, f"{name}_{method.lower()}_")
+    cache_path = cache_prefix + get_seam_hash(ob.data)[:16] + ".npy"
+
+    if os.path.isfile(cache_path):
+        loop_uvs = np.load(cache_path)
+        if len(loop_uvs) == len(ob.data.loops):
+            set_loop_uvs(ob.data, loop_uvs)
+            return True
+
+    if method == 'FAST':
+        fast_uv_unwrap(ob)
+    else:
+        uv_unwrap(ob)
+
+    # Drop the UVs cached for previous versions of the mesh
+    os.makedirs(cache_folder, exist_ok=True)
+    for old_cache_path in glob.glob(glob.escape(cache_prefix) + "*.npy"):
+        os.remove(old_cache_path)
+    np.save(cache_path, get_loop_uvs(ob.data))
+
+    return False
+
+#### Fast unwrap: each chart (faces connected without crossing a seam) is projected on the plane
+# orthogonal to its average normal, then the charts are packed in rows. No LSCM/ABF solve: much faster
+# on dense meshes, but curved charts get more distortion (and may overlap themselves)
+
+# Chart index of every polygon
+def get_uv_charts(mesh):
+    nb_polys = len(mesh.polygons)
+    poly_by_corner, corner_loops = get_corner_loops(mesh)
+    loop_edges = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("edge_index", loop_edges)
+    edge_is_seam = np.empty(len(mesh.edges), dtype=bool)
+    mesh.edges.foreach_get("use_seam", edge_is_seam)
+
+    # Pairs of polygons sharing an edge that is not a seam
+    corner_edges = loop_edges[corner_loops]
+    order = np.argsort(corner_edges, kind='stable')
+    sorted_edges = corner_edges[order]
+    sorted_polys = poly_by_corner[order]
+    linked = (sorted_edges[1:] == sorted_edges[:-1]) & ~edge_is_seam[sorted_edges[1:]]
+    polys_a = sorted_polys[:-1][linked]
+    polys_b = sorted_polys[1:][linked]
+
+    # Connected components: hook roots to the smallest linked root, then pointer jumping, until nothing changes
+    parent = np.arange(nb_polys)
+    while True:
+        previous = parent.copy()
+        np.minimum.at(parent, parent[polys_a], parent[polys_b])
+        np.minimum.at(parent, parent[polys_b], parent[polys_a])
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        if np.array_equal(parent, previous):
+            break
+
+    _, chart_by_poly = np.unique(parent, return_inverse=True)
+    return chart_by_poly
+
+# Shelf packing of the chart bounding boxes, tallest first, in rows about as wide as the square root of their total area
+def pack_charts(sizes, margin):
+    side = max(np.sqrt(np.sum(sizes[:, 0] * sizes[:, 1])), sizes[:, 0].max())
+    gap = margin * side
+    offsets = np.zeros_like(sizes)
+    x, y, row_height = 0, 0, 0
+    for chart in np.argsort(-sizes[:, 1], kind='stable'):
+        width, height = sizes[chart]
+        if x > 0 and x + width > side:
+            x, y, row_height = 0, y + row_height + gap, 0
+        offsets[chart] = (x, y)
+        x += width + gap
+        row_height = max(row_height, height)
+    return offsets
+
+def fast_uv_unwrap(ob, margin=0.001):
+    mesh = ob.data
+    nb_polys = len(mesh.polygons)
+    chart_by_poly = get_uv_charts(mesh)
+    nb_charts = chart_by_poly.max() + 1 if nb_polys > 0 else 0
+
+    # Area weighted average normal and projection basis of every chart
+    normals = np.empty(nb_polys * 3, dtype=np.float32)
+    areas = np.empty(nb_polys, dtype=np.float32)
+    mesh.polygons.foreach_get("normal", normals)
+    mesh.polygons.foreach_get("area", areas)
+    chart_normals = np.zeros((nb_charts, 3))
+    np.add.at(chart_normals, chart_by_poly, normals.reshape(-1, 3) * areas[:, None])
+    lengths = np.linalg.norm(chart_normals, axis=1)
+    chart_normals = np.where(lengths[:, None] > 0, chart_normals / np.maximum(lengths, 1e-12)[:, None], [0, 0, 1])
+
+    helper = np.where(np.abs(chart_normals[:, 2:]) < 0.9, [0, 0, 1], [1, 0, 0])
+    tangents = np.cross(helper, chart_normals)
+    tangents /= np.linalg.norm(tangents, axis=1)[:, None]
+    bitangents = np.cross(chart_normals, tangents)
+
+    # Project the face corners
+    poly_by_corner, corner_loops = get_corner_loops(mesh)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_vertices)
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+
+    corner_charts = chart_by_poly[poly_by_corner]
+    corner_co = co.reshape(-1, 3)[loop_vertices[corner_loops]]
+    uvs = np.column_stack([
+        np.einsum('ij,ij->i', corner_co, tangents[corner_charts]),
+        np.einsum('ij,ij->i', corner_co, bitangents[corner_charts])])
+
+    # Move the charts to the origin, pack them and fit everything in the unit square
+    chart_min = np.full((nb_charts, 2), np.inf)
+    chart_max = np.full((nb_charts, 2), -np.inf)
+    np.minimum.at(chart_min, corner_charts, uvs)
+    np.maximum.at(chart_max, corner_charts, uvs)
+    uvs -= chart_min[corner_charts]
+
+    if nb_charts > 0:
+        uvs += pack_charts(chart_max - chart_min, margin)[corner_charts]
+        uvs /= max(uvs.max(), 1e-12)
+
+    loop_uvs = np.zeros((len(mesh.loops), 2), dtype=np.float32)
+    loop_uvs[corner_loops] = uvs
+    set_loop_uvs(mesh, loop_uvs)
@@ -2,24 +2,8 @@ import numpy as np
 
 ####################################
 
-# Sample code for mesh exporting from Python to ply format
-# Commented in case meshio not available
-
-# import meshio
-
-# def export_to_ply(V, F, filename, vertex_colors=None):
-
-#     points_data = {}
-#     if vertex_colors is not None:
-#         points_data['red'] = (vertex_colors[:, 0] * 255).astype(np.uint8)
-#         points_data['green'] = (vertex_colors[:, 1] * 255).astype(np.uint8)
-#         points_data['blue'] = (vertex_colors[:, 2] * 255).astype(np.uint8)
-
-#     mesh = meshio.Mesh(
-#         V,
-#         cells = [("triangle", F.astype(np.int32))], point_data=points_data)
-
-#     mesh.write(filename)
+# Mesh exporting from Python to ply format: see ply_io.write_ply (binary ply, NumPy only)
+# eg write_ply(filename, V, F, vertex_colors=pack_mesh_properties_to_rgb(labels, model_degrees, is_seam, is_sharp))
 
 ####################################
 
@@ -44,30 +28,56 @@ def pack_mesh_properties_to_rgb(labels, model_degrees, is_seam, is_sharp):
                 seam_marker])
 
 # Unpacking data from blender mesh data (after loading the ply file into blender)
+# All per-corner data is read in bulk with foreach_get, the result is the same as walking
+# every polygon/corner in order (last corner written wins, for faces and for vertices)
 def unpack_mesh_properties(blender_mesh):
 
     color_layer = blender_mesh.vertex_colors['Col']
 
-    sharpness_by_vertex = np.zeros(len(blender_mesh.vertices), dtype=bool)
-    vertex_is_seam = np.zeros(len(blender_mesh.vertices), dtype=bool)
-
-    label_by_poly = []
-    degree_by_poly = []
-
-    for poly in blender_mesh.polygons:
-        # Find out the color of this face
-        label = 0
-        degree = 0
-        for i, index in enumerate(poly.vertices):
-            loop_index = poly.loop_indices[i]
-            if color_layer.data[loop_index].color[0] > 0:
-                label = color_layer.data[loop_index].color[0]
-                degree = color_layer.data[loop_index].color[1]
-
-            sharpness_by_vertex[index] = color_layer.data[loop_index].color[2] > 0.5
-            vertex_is_seam[index] = color_layer.data[loop_index].color[2] > 0
-            
-        label_by_poly.append(label)
-        degree_by_poly.append(degree)
-
-    return sharpness_by_vertex, vertex_is_seam, label_by_poly, degree_by_poly
\ No newline at end of file
+    nb_vertices = len(blender_mesh.vertices)
+    nb_polys = len(blender_mesh.polygons)
+    nb_loops = len(blender_mesh.loops)
+
+    loop_starts = np.empty(nb_polys, dtype=np.int32)
+    loop_totals = np.empty(nb_polys, dtype=np.int32)
+    blender_mesh.polygons.foreach_get("loop_start", loop_starts)
+    blender_mesh.polygons.foreach_get("loop_total", loop_totals)
+
+    loop_vertices = np.empty(nb_loops, dtype=np.int32)
+    blender_mesh.loops.foreach_get("vertex_index", loop_vertices)
+
+    colors = np.empty(nb_loops * 4, dtype=np.float32)
+    color_layer.data.foreach_get("color", colors)
+    colors.shape = (nb_loops, 4)
+
+    # Loop indices in the order polygons and their corners are visited
+    poly_by_corner = np.repeat(np.arange(nb_polys), loop_totals)
+    first_corner = np.cumsum(loop_totals) - loop_totals
+    corner_loops = loop_starts[poly_by_corner] + np.arange(len(poly_by_corner)) - first_corner[poly_by_corner]
+
+    corner_colors = colors[corner_loops]
+    corner_vertices = loop_vertices[corner_loops]
+
+    # Per face: keep the last corner with R > 0
+    labelled_corners = np.flatnonzero(corner_colors[:, 0] > 0)
+    labelled_polys = poly_by_corner[labelled_corners]
+    is_last = np.ones(len(labelled_polys), dtype=bool)
+    is_last[:-1] = labelled_polys[1:] != labelled_polys[:-1]
+    last_corners = labelled_corners[is_last]
+
+    label_by_poly = np.zeros(nb_polys)
+    degree_by_poly = np.zeros(nb_polys)
+    label_by_poly[labelled_polys[is_last]] = corner_colors[last_corners, 0]
+    degree_by_poly[labelled_polys[is_last]] = corner_colors[last_corners, 1]
+
+    # Per vertex: keep the value from the last corner referencing the vertex
+    reversed_vertices = corner_vertices[::-1]
+    vertices, first_in_reversed = np.unique(reversed_vertices, return_index=True)
+    last_seam_marker = corner_colors[::-1, 2][first_in_reversed]
+
+    sharpness_by_vertex = np.zeros(nb_vertices, dtype=bool)
+    vertex_is_seam = np.zeros(nb_vertices, dtype=bool)
+    sharpness_by_vertex[vertices] = last_seam_marker > 0.5
+    vertex_is_seam[vertices] = last_seam_marker > 0
+
+    return sharpness_by_vertex, vertex_is_seam, label_by_poly, degree_by_poly
@@ -0,0 +1,136 @@
+import numpy as np
+
+####################################
+
+# Minimal binary PLY reader/writer working directly on NumPy arrays (no meshio, no bpy needed)
+# - read_ply memory-maps the vertex and face blocks: no per-element Python parsing
+# - faces must all have the same number of vertices (eg triangle meshes, as exported by our pipeline)
+
+####################################
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1',
+    'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2',
+    'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4',
+    'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4',
+    'double': 'f8', 'float64': 'f8',
+}
+
+PLY_FORMATS = {
+    'binary_little_endian': '<',
+    'binary_big_endian': '>',
+}
+
+FACE_INDICES_NAMES = ('vertex_indices', 'vertex_index')
+
+
+def write_ply(filename, V, F, vertex_colors=None):
+    V = np.asarray(V)
+    F = np.asarray(F)
+
+    vertex_dtype = [('x', '<f4'), ('y', '<f4'), ('z', '<f4')]
+    if vertex_colors is not None:
+        vertex_dtype += [('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+
+    vertices = np.empty(len(V), dtype=vertex_dtype)
+    vertices['x'], vertices['y'], vertices['z'] = V[:, 0], V[:, 1], V[:, 2]
+    if vertex_colors is not None:
+        # Colors in [0, 1]
+        rgb = (np.asarray(vertex_colors)[:, :3] * 255).astype(np.uint8)
+        vertices['red'], vertices['green'], vertices['blue'] = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+
+    faces = np.empty(len(F), dtype=[('count', 'u1'), ('indices', '<i4', (F.shape[1],))])
+    faces['count'] = F.shape[1]
+    faces['indices'] = F
+
+    header = ["ply", "format binary_little_endian 1.0", f"element vertex {len(V)}"]
+    header += [f"property float {name}" for name in 'xyz']
+    if vertex_colors is not None:
+        header += [f"property uchar {name}" for name in ('red', 'green', 'blue')]
+    header += [f"element face {len(F)}", "property list uchar int vertex_indices", "end_header"]
+
+    with open(filename, 'wb') as ply_file:
+        ply_file.write(("\n".join(header) + "\n").encode('ascii'))
+        ply_file.write(vertices.tobytes())
+        ply_file.write(faces.tobytes())
+
+
+def read_ply_header(ply_file):
+    if ply_file.readline().strip() != b'ply':
+        raise ValueError("Not a PLY file")
+
+    endianness = None
+    elements = [] # [name, count, [(property name, dtype or (count dtype, item dtype))]]
+    while True:
+        line = ply_file.readline()
+        if not line:
+            raise ValueError("Unexpected end of PLY header")
+        words = line.decode('ascii').split()
+        if len(words) == 0 or words[0] in ('comment', 'obj_info'):
+            continue
+        if words[0] == 'end_header':
+            break
+        if words[0] == 'format':
+            if words[1] not in PLY_FORMATS:
+                raise ValueError(f"Unsupported PLY format {words[1]} (only binary PLY files can be memory-mapped)")
+            endianness = PLY_FORMATS[words[1]]
+        elif words[0] == 'element':
+            elements.append([words[1], int(words[2]), []])
+        elif words[0] == 'property':
+            if words[1] == 'list':
+                elements[-1][2].append((words[4], (PLY_TYPES[words[2]], PLY_TYPES[words[3]])))
+            else:
+                elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+
+    return endianness, elements, ply_file.tell()
+
+
+# Returns V (n x 3 float), F (m x k int) and vertex colors (n x 3 float in [0, 1], or None)
+def read_ply(filename):
+    with open(filename, 'rb') as ply_file:
+        endianness, elements, offset = read_ply_header(ply_file)
+
+    data = {}
+    for name, count, properties in elements:
+        fields = []
+        for property_name, property_type in properties:
+            if isinstance(property_type, tuple):
+                # List property: all elements must have the same length, read it from the first element
+                count_type, item_type = property_type
+                first_count = 0
+                if count > 0:
+                    count_offset = offset + (np.dtype(fields).itemsize if fields else 0)
+                    first_count = np.memmap(filename, dtype=endianness + count_type, mode='r', offset=count_offset, shape=(1,))[0]
+                fields.append((property_name + '_count', endianness + count_type))
+                fields.append((property_name, endianness + item_type, (int(first_count),)))
+            else:
+                fields.append((property_name, endianness + property_type))
+
+        dtype = np.dtype(fields)
+        block = np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=(count,)) if count > 0 else np.empty(0, dtype=dtype)
+        for property_name, property_type in properties:
+            if isinstance(property_type, tuple) and count > 0 and np.any(block[property_name + '_count'] != block[property_name + '_count'][0]):
+                raise ValueError(f"Element '{name}' has lists of different lengths, mixed polygon sizes are not supported")
+
+        data[name] = block
+        offset += dtype.itemsize * count
+
+    vertices = data['vertex']
+    V = np.column_stack([vertices['x'], vertices['y'], vertices['z']])
+
+    faces = data.get('face')
+    F = np.empty((0, 3), dtype=np.int32)
+    if faces is not None:
+        indices_name = next(name for name in FACE_INDICES_NAMES if name in faces.dtype.names)
+        F = np.array(faces[indices_name], dtype=np.int32)
+
+    vertex_colors = None
+    if all(c in vertices.dtype.names for c in ('red', 'green', 'blue')):
+        vertex_colors = np.column_stack([vertices['red'], vertices['green'], vertices['blue']]).astype(np.float32)
+        if vertices.dtype['red'].kind in 'ui':
+            vertex_colors /= 255
+
+    return V, F, vertex_colors
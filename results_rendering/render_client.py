@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import socket
+import tempfile
+import argparse
+
+##### Submit a render job to blender_render_daemon.py and wait for it (plain Python, no Blender needed)
+# python render_client.py -m "mesh_.*" --camera 0 --materials shiny rainbow-labels -r 720
+# python render_client.py --shutdown
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "blender_render.sock")
+
+
+# Send the request and yield the daemon messages until the request is complete
+def submit(request, socket_path=DEFAULT_SOCKET_PATH):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + "\n").encode('utf-8'))
+        with client.makefile('r', encoding='utf-8') as messages:
+            for line in messages:
+                message = json.loads(line)
+                yield message
+                if message['status'] in ('finished', 'error', 'shutdown'):
+                    return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-m', '--mesh', help='Pattern to select mesh(es)', type=str, default=".+")
+    parser.add_argument('--camera', help='Index of the camera to render (default = all)', type=int, default=None)
+    parser.add_argument('--materials', help='Name of the material(s) to render', type=str, default=["shiny"], nargs='+')
+    parser.add_argument('-r', '--res', help='Image resolution', dest='resolution', type=int, default=1080)
+    parser.add_argument('--frame-start', help='First frame (default = from the blend file)', dest='frame_start', type=int, default=None)
+    parser.add_argument('--frame-end', help='Last frame (default = from the blend file)', dest='frame_end', type=int, default=None)
+    parser.add_argument('--turntables', help='Render turntable animations', dest='turntables', action='store_true', default=False)
+    parser.add_argument('--single-pass', help='Render all the materials in one render call per camera/frame', dest='single_pass', action='store_true', default=False)
+    parser.add_argument('--out-folder', help='Name of the output folder (default = the daemon one)', dest='out_folder', type=str, default=None)
+    parser.add_argument('--socket', help='Path of the daemon Unix socket', dest='socket_path', type=str, default=DEFAULT_SOCKET_PATH)
+    parser.add_argument('--shutdown', help='Stop the daemon', action='store_true', default=False)
+
+    args = parser.parse_args()
+
+    if args.shutdown:
+        request = {'command': 'shutdown'}
+    else:
+        request = {
+            'mesh': args.mesh,
+            'camera': args.camera,
+            'materials': args.materials,
+            'resolution': args.resolution,
+            'turntables': args.turntables,
+            'single_pass': args.single_pass,
+            'out_folder': args.out_folder,
+        }
+        if args.frame_start is not None:
+            request['frame_start'] = args.frame_start
+        if args.frame_end is not None:
+            request['frame_end'] = args.frame_end
+
+    # The request only succeeded if it ran to its end: the daemon may also stop or close the connection midway
+    success = True
+    completed = False
+    for message in submit(request, args.socket_path):
+        status = message['status']
+        completed = status in ('finished', 'error', 'shutdown')
+        if status == 'queued':
+            print(f"{len(message['jobs'])} job(s) queued")
+        elif status == 'started':
+            print(f"Rendering {message['job']}")
+        elif status == 'done':
+            print(f"Done {message['job']}: {message['output']}")
+        elif status == 'failed':
+            print(f"FAILED {message['job']}: {message['error'].strip().splitlines()[-1]}")
+        elif status == 'finished':
+            print(f"Finished: {message['done']} done, {message['failed']} failure(s)")
+            success = message['failed'] == 0
+        elif status == 'error':
+            print(f"ERROR: {message['error']}")
+            success = False
+        elif status == 'shutdown':
+            print("Daemon stopped")
+
+    if not completed:
+        print("ERROR: the daemon closed the connection before the end of the request")
+        success = False
+
+    if not success:
+        sys.exit(1)
@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+import time
+import argparse
+from contextlib import contextmanager
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: peak RSS is not recorded
+    resource = None
+
+####################################
+
+# Per-stage timing and memory tracing, written as JSON lines (one record per stage or rendered frame)
+# Disabled (no-op) until enable_tracing is called
+# Summarize a trace file with:
+# python tracing.py out/trace.jsonl
+
+####################################
+
+trace_file = None
+
+# Fields added to every record (eg mesh name, vertex/face counts, render job)
+trace_context = {}
+
+frame_start = None
+
+# Names of the stages being traced, innermost last: records of nested stages (eg the frames of a render job)
+# get the enclosing stage as 'parent', so they are not counted twice in the totals
+open_stages = []
+
+
+def enable_tracing(path):
+    global trace_file
+    trace_file = open(path, 'a', buffering=1)
+
+def is_tracing():
+    return trace_file is not None
+
+def set_trace_context(**fields):
+    trace_context.clear()
+    trace_context.update(fields)
+
+def update_trace_context(**fields):
+    trace_context.update(fields)
+
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak_rss / 1024 ** 2 if sys.platform == 'darwin' else peak_rss / 1024
+
+def write_record(record):
+    if trace_file is None:
+        return
+    record['pid'] = os.getpid()
+    record['peak_rss_mb'] = get_peak_rss_mb()
+    trace_file.write(json.dumps(record) + "\n")
+
+# with trace("stage name", extra_field=value) as record: ... (more fields can be added to record in the block)
+@contextmanager
+def trace(stage, **fields):
+    if trace_file is None:
+        yield {}
+        return
+
+    record = dict(stage=stage, parent=open_stages[-1] if open_stages else None, **fields)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    open_stages.append(stage)
+    try:
+        yield record
+    finally:
+        open_stages.pop()
+        # Context as of the end of the stage (the block may set it, eg once the mesh is known)
+        record = dict(trace_context, **record)
+        record['wall_time'] = time.perf_counter() - wall_start
+        record['cpu_time'] = time.process_time() - cpu_start
+        write_record(record)
+
+
+#### Render time per frame, from the render pre/post handlers
+
+def on_render_pre(scene, *args):
+    global frame_start
+    frame_start = (time.perf_counter(), time.process_time())
+
+def on_render_post(scene, *args):
+    if frame_start is None:
+        return
+    wall_start, cpu_start = frame_start
+    write_record(dict(
+        trace_context,
+        stage='render_frame',
+        parent=open_stages[-1] if open_stages else None,
+        frame=scene.frame_current,
+        wall_time=time.perf_counter() - wall_start,
+        cpu_time=time.process_time() - cpu_start))
+
+def trace_render_frames():
+    import bpy
+    bpy.app.handlers.render_pre.append(on_render_pre)
+    bpy.app.handlers.render_post.append(on_render_post)
+
+
+#### Summary
+
+def load_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# Totals only add up the top level stages, nested stages are listed with their parent stage
+def summarize(records, top=5):
+    time_by_mesh = defaultdict(lambda: defaultdict(float))
+    count_by_mesh = defaultdict(lambda: defaultdict(int))
+    total_by_mesh = defaultdict(float)
+    peak_rss_by_mesh = defaultdict(float)
+    for record in records:
+        mesh = record.get('mesh', '-')
+        stage = (record['stage'], record.get('parent'))
+        time_by_mesh[mesh][stage] += record['wall_time']
+        count_by_mesh[mesh][stage] += 1
+        if record.get('parent') is None:
+            total_by_mesh[mesh] += record['wall_time']
+        peak_rss_by_mesh[mesh] = max(peak_rss_by_mesh[mesh], record.get('peak_rss_mb') or 0)
+
+    for mesh in sorted(time_by_mesh, key=lambda m: -total_by_mesh[m]):
+        stage_times = time_by_mesh[mesh]
+        print(f"{mesh}: {total_by_mesh[mesh]:.2f}s total, peak RSS {peak_rss_by_mesh[mesh]:.0f} MB")
+        for stage, parent in sorted(stage_times, key=lambda s: -stage_times[s])[:top]:
+            count = count_by_mesh[mesh][(stage, parent)]
+            calls = f" ({count} calls)" if count > 1 else ""
+            name = stage if parent is None else f"{stage} (in {parent})"
+            print(f"  {name:<32} {stage_times[(stage, parent)]:8.2f}s{calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('trace_file', help='JSON lines trace file', type=str)
+    parser.add_argument('--top', help='Number of stages to show per mesh', type=int, default=5)
+
+    args = parser.parse_args()
+
+    summarize(load_records(args.trace_file), top=args.top)
@@ -11,25 +11,124 @@ bl_info = {
 
 import bpy
 import os
-import subprocess
+import numpy as np
 from bpy_extras.io_utils import ImportHelper
+from concurrent.futures import ThreadPoolExecutor
 
 def get_selected_vertices():
     # If the current active object is not a mesh, return
     if bpy.context.active_object.type != 'MESH':
-        return []
-
-    current_mode = bpy.context.active_object.mode
-    if bpy.context.mode != 'OBJECT':
-        bpy.ops.object.mode_set(mode='OBJECT')
+        return np.empty(0, dtype=int)
 
     ob = bpy.context.active_object
     mesh = ob.data
-    selected_verts = [v.index for v in mesh.vertices if v.select]
-            
-    bpy.ops.object.mode_set(mode=current_mode)
 
-    return selected_verts
+    # In edit mode, copy the edit-mode selection to the mesh data (no mode switch)
+    if ob.mode == 'EDIT':
+        ob.update_from_editmode()
+
+    is_selected = np.empty(len(mesh.vertices), dtype=bool)
+    mesh.vertices.foreach_get("select", is_selected)
+
+    return np.flatnonzero(is_selected)
+
+# Compact text form of sorted vertex indices, eg "0-41,57,60-99"
+def encode_ranges(indices):
+    indices = np.asarray(indices)
+    if len(indices) == 0:
+        return ""
+    breaks = np.flatnonzero(np.diff(indices) != 1)
+    starts = indices[np.concatenate([[0], breaks + 1])]
+    ends = indices[np.concatenate([breaks, [len(indices) - 1]])]
+    return ",".join(f"{start}" if start == end else f"{start}-{end}" for start, end in zip(starts, ends))
+
+# Binary selection file next to the mesh file it was loaded from (or next to the blend file)
+# None if there is neither (mesh not loaded from a file and blend file not saved)
+def get_selection_path(ob):
+    mesh_path = ob.get("source_filepath")
+    if mesh_path:
+        return os.path.splitext(mesh_path)[0] + "_selection.npy"
+    if not bpy.data.filepath:
+        return None
+    return bpy.path.abspath(f"//{bpy.path.clean_name(ob.name)}_selection.npy")
+
+
+# Lookup table: is_whitespace[char]
+IS_WHITESPACE = np.zeros(256, dtype=bool)
+IS_WHITESPACE[np.frombuffer(b' \t\r\n', dtype=np.uint8)] = True
+
+# Number of whitespace separated tokens on each line of a text made of nb_lines lines ending with '\n'
+def count_tokens_per_line(text, nb_lines):
+    chars = np.frombuffer(text, dtype=np.uint8)
+    is_space = IS_WHITESPACE[chars]
+    token_starts = np.flatnonzero(~is_space & np.concatenate([[True], is_space[:-1]]))
+    line_by_token = np.searchsorted(np.flatnonzero(chars == ord('\n')), token_starts)
+    return np.bincount(line_by_token, minlength=nb_lines)[:nb_lines]
+
+# Parse the vertices and faces of an obj file into NumPy arrays, in file order (as split_mode='OFF' does)
+# Faces are stored as face sizes + flat vertex indices, to support any polygon size
+# The 'v' and 'f' lines are selected and parsed with NumPy on the whole file, no per-line Python code
+def parse_obj(path):
+    with open(path, 'rb') as obj_file:
+        data = obj_file.read()
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    chars = np.frombuffer(data, dtype=np.uint8).copy()
+
+    line_ends = np.flatnonzero(chars == ord('\n')) + 1
+    line_starts = np.concatenate([[0], line_ends[:-1]])
+    keyword_end = chars[np.minimum(line_starts + 1, len(chars) - 1)]
+    has_keyword = (keyword_end == ord(' ')) | (keyword_end == ord('\t'))
+    is_vertex_line = has_keyword & (chars[line_starts] == ord('v'))
+    is_face_line = has_keyword & (chars[line_starts] == ord('f'))
+
+    # Blank the keywords, then keep the characters of the vertex (resp. face) lines only
+    chars[line_starts[is_vertex_line | is_face_line]] = ord(' ')
+    line_lengths = line_ends - line_starts
+    vertex_text = chars[np.repeat(is_vertex_line, line_lengths)].tobytes()
+    face_chars = chars[np.repeat(is_face_line, line_lengths)]
+    # Only keep the vertex index of each face corner: blank the /vt/vn parts (from a '/' to the next whitespace)
+    positions = np.arange(len(face_chars), dtype=np.int32)
+    last_slash = np.maximum.accumulate(np.where(face_chars == ord('/'), positions, -1))
+    last_space = np.maximum.accumulate(np.where(IS_WHITESPACE[face_chars], positions, -1))
+    face_chars[last_slash > last_space] = ord(' ')
+    face_text = face_chars.tobytes()
+
+    nb_vertices = np.count_nonzero(is_vertex_line)
+    coordinates = np.fromstring(vertex_text, dtype=np.float32, sep=' ')
+    # Vertices can have more than 3 values (w, or colors): keep the first 3
+    values_per_vertex = count_tokens_per_line(vertex_text, nb_vertices)
+    first_value = np.cumsum(values_per_vertex) - values_per_vertex
+    V = coordinates[first_value[:, None] + np.arange(3)]
+
+    face_sizes = count_tokens_per_line(face_text, np.count_nonzero(is_face_line)).astype(np.int32)
+    face_indices = np.fromstring(face_text, dtype=np.int64, sep=' ')
+    # Negative indices are relative to the last vertex read before the face
+    vertices_before = np.repeat(np.cumsum(is_vertex_line)[is_face_line], face_sizes)
+    face_indices = np.where(face_indices > 0, face_indices - 1, vertices_before + face_indices).astype(np.int32)
+
+    return V, face_sizes, face_indices
+
+def parse_obj_files(paths, max_workers=None):
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(parse_obj, paths))
+
+# Create the mesh with bulk setters
+def create_mesh_object(name, V, face_sizes, face_indices):
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(V))
+    mesh.loops.add(len(face_indices))
+    mesh.polygons.add(len(face_sizes))
+
+    mesh.vertices.foreach_set("co", V.ravel())
+    mesh.loops.foreach_set("vertex_index", face_indices)
+    mesh.polygons.foreach_set("loop_start", (np.cumsum(face_sizes) - face_sizes).astype(np.int32))
+    mesh.polygons.foreach_set("loop_total", face_sizes)
+
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    return bpy.data.objects.new(name, mesh)
 
 
 class LoadObjMeshOperator(bpy.types.Operator, ImportHelper):
@@ -48,13 +147,44 @@ class LoadObjMeshOperator(bpy.types.Operator, ImportHelper):
     files : bpy.props.CollectionProperty(name="Mesh Files", description="OBJ files to load", type=bpy.types.OperatorFileListElement)
     directory : bpy.props.StringProperty(subtype='DIR_PATH')
 
+    geometry_only : bpy.props.BoolProperty(
+            name="Geometry Only",
+            description="Fast loading of the vertices and faces only. UVs, normals, materials and smooth shading are not imported (uncheck to use the OBJ importer)",
+            default=True,
+            )
+
     def execute(self, context):
-        for file in self.files:
-            path = os.path.join(self.directory, file.name)
+        paths = [os.path.join(self.directory, file.name) for file in self.files]
+
+        if not self.geometry_only:
+            for path in paths:
+                print("import %s" % path)
+                # Load mesh file (important to keep vertices order! => split_mode = OFF)
+                bpy.ops.import_scene.obj(filepath=path, split_mode='OFF')
+                ob = bpy.context.selected_objects[0]
+                ob["source_filepath"] = path
+                ob.hide_set(True)
+            return {'FINISHED'}
+
+        for path in paths:
             print("import %s" % path)
-            # Load mesh file (important to keep vertices order! => split_mode = OFF)
-            bpy.ops.import_scene.obj(filepath=path, split_mode='OFF')
-            ob = bpy.context.selected_objects[0]
+
+        # Parse all files concurrently (vertices order is kept), then create the meshes here: bpy is not thread safe
+        # (NumPy releases the GIL in most of the array passes of the parser)
+        parsed_meshes = parse_obj_files(paths)
+
+        objects = []
+        for path, (V, face_sizes, face_indices) in zip(paths, parsed_meshes):
+            # Same axis conversion as the obj importer (Y up => Z up)
+            V = np.column_stack([V[:, 0], -V[:, 2], V[:, 1]])
+            ob = create_mesh_object(os.path.splitext(os.path.basename(path))[0], V, face_sizes, face_indices)
+            ob["source_filepath"] = path
+            objects.append(ob)
+
+        # Link all objects hidden, in one batch
+        for ob in objects:
+            context.collection.objects.link(ob)
+        for ob in objects:
             ob.hide_set(True)
 
         return {'FINISHED'}
@@ -64,15 +194,32 @@ class GetSelectedVerticesOperator(bpy.types.Operator):
     bl_idname = "selector.get_selected_vertices"        # Unique identifier for buttons and menu items to reference.
     bl_label = "Get Selected Vertices"         # Display name in the interface.
 
+    export_format : bpy.props.EnumProperty(
+            name="Format",
+            items=[
+                ('RANGES', "Ranges", "Copy the vertex indices to the clipboard as ranges, eg 0-41,57,60-99"),
+                ('NPY', "NumPy file", "Save the vertex indices to a .npy file next to the mesh file"),
+            ],
+            default='RANGES',
+            )
+
     @classmethod
     def poll(cls, context):
         return bpy.context.active_object and bpy.context.active_object.type == 'MESH'
 
     def execute(self, context):        # execute() is called when running the operator.
         selected_vertices_ids = get_selected_vertices()
-        print(selected_vertices_ids)
 
-        subprocess.run("pbcopy", input=str(selected_vertices_ids).encode())
+        if self.export_format == 'NPY':
+            path = get_selection_path(context.active_object)
+            if path is None:
+                self.report({'ERROR'}, "Save the blend file first: the selection is saved next to it")
+                return {'CANCELLED'}
+            np.save(path, selected_vertices_ids)
+            self.report({'INFO'}, f"Saved {len(selected_vertices_ids)} vertices to {path}")
+        else:
+            context.window_manager.clipboard = encode_ranges(selected_vertices_ids)
+            self.report({'INFO'}, f"Copied {len(selected_vertices_ids)} vertices to the clipboard")
 
 
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
@@ -98,7 +245,8 @@ class SelectorPanel(bpy.types.Panel):
         # GET SELECTED VERTICES
         row = layout.row()
         row.label(text="Get selected", icon='DUPLICATE')
-        layout.operator(GetSelectedVerticesOperator.bl_idname)
+        layout.operator(GetSelectedVerticesOperator.bl_idname, text="Copy Selected Vertices").export_format = 'RANGES'
+        layout.operator(GetSelectedVerticesOperator.bl_idname, text="Save Selected Vertices (.npy)").export_format = 'NPY'
 
 
 def register():